@@ -0,0 +1,203 @@
+"""
+This file handles per-request and per-tenant token accounting and quotas.
+services.py reports every upstream call here; usage is attributed to the
+request running in the current context, aggregated in memory, and flushed
+in batches to a local SQLite database.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+from typing import AsyncGenerator, Awaitable, Optional
+
+from fastapi import HTTPException
+
+import config
+
+# The request whose upstream calls are currently being made (set per analysis task)
+current_account: ContextVar[Optional[dict]] = ContextVar("current_account", default=None)
+
+_pending_requests = []
+_pending_totals = {}
+_tenant_daily = {}
+_last_flush = time.monotonic()
+stats = {"requests": 0, "calls": 0, "estimated_calls": 0, "flushes": 0, "quota_rejections": 0}
+
+# ==================== TENANTS ====================
+def tenant_for(api_key: Optional[str]) -> str:
+    """Tenant name for an API key; unknown keys get a stable anonymised id"""
+    if not api_key:
+        return "anonymous"
+    if api_key in config.API_KEY_TENANTS:
+        return config.API_KEY_TENANTS[api_key]
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+def start_request(tenant: str) -> dict:
+    return {
+        "request_id": uuid.uuid4().hex, "tenant": tenant, "started_at": datetime.utcnow().isoformat(),
+        "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "calls": 0, "estimated_calls": 0,
+    }
+
+def current_tenant() -> str:
+    account = current_account.get()
+    return account["tenant"] if account else "anonymous"
+
+def usage_summary(account: Optional[dict] = None) -> Optional[dict]:
+    """Token usage so far for the given (or current) request"""
+    account = account or current_account.get()
+    if account is None:
+        return None
+    summary = {key: account[key] for key in ("prompt_tokens", "completion_tokens", "calls", "estimated_calls")}
+    summary["cost_usd"] = round(account["cost_usd"], 6)
+    return summary
+
+async def attributed_stream(account: dict, generator: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """Run a stream with its upstream calls attributed to account"""
+    current_account.set(account)
+    try:
+        async for frame in generator:
+            yield frame
+    finally:
+        finish_request(account)
+
+async def attributed_call(account: dict, awaitable: Awaitable):
+    """Await a coroutine with its upstream calls attributed to account"""
+    current_account.set(account)
+    try:
+        return await awaitable
+    finally:
+        finish_request(account)
+
+# ==================== RECORDING ====================
+def estimate_tokens(text: str) -> int:
+    """Local estimate (~4 characters per token) for responses without a usage block"""
+    return max(1, len(text) // 4) if text else 0
+
+def record(provider: str, model: str, prompt_tokens: int, completion_tokens: int, estimated: bool):
+    """Account one upstream call to the current request and its tenant"""
+    pricing = config.MODEL_PRICING_PER_MTOK.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * pricing[0] + completion_tokens * pricing[1]) / 1_000_000
+    stats["calls"] += 1
+    stats["estimated_calls"] += int(estimated)
+
+    account = current_account.get()
+    tenant = account["tenant"] if account else "unattributed"
+    if account is not None:
+        account["prompt_tokens"] += prompt_tokens
+        account["completion_tokens"] += completion_tokens
+        account["cost_usd"] += cost
+        account["calls"] += 1
+        account["estimated_calls"] += int(estimated)
+
+    day = date.today().isoformat()
+    totals = _pending_totals.setdefault((day, tenant, provider, model), [0, 0, 0.0, 0])
+    totals[0] += prompt_tokens
+    totals[1] += completion_tokens
+    totals[2] += cost
+    totals[3] += 1
+    daily_usage(tenant)
+    _tenant_daily[(day, tenant)] += prompt_tokens + completion_tokens
+
+def finish_request(account: dict):
+    if account.get("finished"):
+        return
+    account["finished"] = True
+    stats["requests"] += 1
+    _pending_requests.append(account)
+    maybe_flush()
+
+# ==================== QUOTAS ====================
+def daily_usage(tenant: str) -> int:
+    """Tokens used by a tenant today (loaded from the store on first access)"""
+    key = (date.today().isoformat(), tenant)
+    if key not in _tenant_daily:
+        for stale in [k for k in _tenant_daily if k[0] != key[0]]:
+            del _tenant_daily[stale]
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) FROM tenant_usage WHERE day = ? AND tenant = ?", key
+            ).fetchone()
+        _tenant_daily[key] = row[0]
+    return _tenant_daily[key]
+
+def check_quota(tenant: str):
+    """Raise HTTPException(429) if the tenant has used up today's token quota"""
+    quota = config.TENANT_DAILY_TOKEN_QUOTAS.get(tenant, config.DEFAULT_DAILY_TOKEN_QUOTA)
+    if quota and daily_usage(tenant) >= quota:
+        stats["quota_rejections"] += 1
+        tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        raise HTTPException(
+            status_code=429,
+            detail=f"Daily token quota of {quota} exhausted for tenant '{tenant}'",
+            headers={"Retry-After": str(int((tomorrow - datetime.now()).total_seconds()) + 1)}
+        )
+
+# ==================== PERSISTENCE ====================
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(config.ACCOUNTING_DB_PATH)
+    conn.execute("""CREATE TABLE IF NOT EXISTS tenant_usage (
+        day TEXT, tenant TEXT, provider TEXT, model TEXT,
+        prompt_tokens INTEGER, completion_tokens INTEGER, cost_usd REAL, calls INTEGER,
+        PRIMARY KEY (day, tenant, provider, model))""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS request_usage (
+        request_id TEXT PRIMARY KEY, tenant TEXT, started_at TEXT,
+        prompt_tokens INTEGER, completion_tokens INTEGER, cost_usd REAL, calls INTEGER, estimated_calls INTEGER)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_request_usage_tenant ON request_usage (tenant, started_at)")
+    return conn
+
+def _write_batch(requests: list, totals: dict):
+    try:
+        _write_rows(requests, totals)
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to flush usage counters: {e}")
+
+def _write_rows(requests: list, totals: dict):
+    with closing(_connect()) as conn, conn:
+        conn.executemany(
+            """INSERT INTO tenant_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (day, tenant, provider, model) DO UPDATE SET
+               prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+               completion_tokens = completion_tokens + excluded.completion_tokens,
+               cost_usd = cost_usd + excluded.cost_usd,
+               calls = calls + excluded.calls""",
+            [(*key, *values) for key, values in totals.items()]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO request_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r["request_id"], r["tenant"], r["started_at"], r["prompt_tokens"], r["completion_tokens"],
+              r["cost_usd"], r["calls"], r["estimated_calls"]) for r in requests]
+        )
+
+def maybe_flush(force: bool = False, wait: bool = False):
+    """
+    Write pending counters in one batch once enough have piled up or the interval has passed.
+    The write runs in a worker thread unless wait is set (used at shutdown).
+    """
+    global _pending_requests, _pending_totals, _last_flush
+    due = len(_pending_requests) >= config.ACCOUNTING_FLUSH_BATCH or time.monotonic() - _last_flush >= config.ACCOUNTING_FLUSH_INTERVAL
+    if not (_pending_requests or _pending_totals) or not (force or due):
+        return
+    requests, totals = _pending_requests, _pending_totals
+    _pending_requests, _pending_totals = [], {}
+    _last_flush = time.monotonic()
+    stats["flushes"] += 1
+    if wait:
+        _write_batch(requests, totals)
+        return
+    try:
+        asyncio.get_running_loop().run_in_executor(None, _write_batch, requests, totals)
+    except RuntimeError:
+        # No running event loop: write synchronously
+        _write_batch(requests, totals)
+
+def metrics() -> dict:
+    today = date.today().isoformat()
+    return {
+        **stats,
+        "pending_requests": len(_pending_requests),
+        "tenants_today": {tenant: tokens for (day, tenant), tokens in _tenant_daily.items() if day == today},
+    }
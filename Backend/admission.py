@@ -0,0 +1,189 @@
+"""
+This file handles admission control and load shedding.
+Each request's pending token work is estimated up front and compared with
+the configured provider capacity. Under pressure requests are admitted in
+degraded mode (low-value sections served from local heuristics); beyond
+capacity priority tenants wait in a short bounded queue and everyone else
+gets a 503 with Retry-After.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi import HTTPException
+
+import config
+from analysis import STRUCTURED_MAX_TOKENS
+from models import LinkedInProfile
+
+# Upper bound of generated tokens per pass (the max_tokens used in analysis)
+SECTION_OUTPUT_TOKENS = {
+    'context': 300, 'headline': 2000, 'about': 1500, 'experience': 1200, 'education': 800,
+    'skills': 1000, 'projects': 1000, 'certifications': 800, 'holistic': 2000,
+}
+JOB_MATCH_OUTPUT_TOKENS = 2500
+PROMPT_OVERHEAD_TOKENS = 400
+
+class Ticket:
+    def __init__(self, tokens: int, degraded_sections: frozenset, tenant: str = "anonymous", coalesced: bool = False):
+        self.tokens = tokens
+        self.degraded_sections = degraded_sections
+        self.tenant = tenant
+        # Admitted for free to attach to an in-flight analysis; it may not start one
+        self.coalesced = coalesced
+        # Safety net: a reservation that is never released (e.g. the client left before
+        # the stream started) stops counting after this point
+        self.expires_at = time.monotonic() + config.ADMISSION_TICKET_TTL
+
+_active: set = set()
+_waiters: deque = deque()
+_capacity_changed = asyncio.Event()
+stats = {"admitted": 0, "degraded": 0, "queued": 0, "rejected": 0, "tenant_rejected": 0, "coalesced": 0}
+
+def estimate_tokens(profile: LinkedInProfile, skipped_sections=frozenset()) -> int:
+    """Rough prompt + completion token cost of a full analysis, skipping the given sections"""
+    profile_tokens = len(profile.model_dump_json()) // 4
+    structured = profile.output_format == "structured"
+    per_persona = 0
+    for section, output_tokens in SECTION_OUTPUT_TOKENS.items():
+        if section in skipped_sections:
+            continue
+        if structured and section != 'context':
+            output_tokens = min(output_tokens, STRUCTURED_MAX_TOKENS)
+        per_persona += output_tokens + PROMPT_OVERHEAD_TOKENS
+    per_persona += profile_tokens
+
+    if profile.is_job_seeking and profile.target_job_descriptions:
+        job_descriptions = [desc for desc in profile.target_job_descriptions if len(desc.strip()) > 50]
+        per_persona += sum(JOB_MATCH_OUTPUT_TOKENS + PROMPT_OVERHEAD_TOKENS + len(desc[:2000]) // 4 for desc in job_descriptions)
+
+    return per_persona * len(profile.target_personas or ["general"])
+
+def retry_after_seconds(excess_tokens: int) -> int:
+    return max(1, math.ceil(excess_tokens / config.PROVIDER_TOKENS_PER_SECOND))
+
+def is_priority(api_key: Optional[str]) -> bool:
+    return bool(api_key) and api_key in config.PRIORITY_API_KEYS
+
+def inflight_tokens() -> int:
+    """Tokens reserved by running analyses, dropping expired reservations"""
+    now = time.monotonic()
+    for ticket in [t for t in _active if t.expires_at <= now]:
+        _active.discard(ticket)
+    return sum(ticket.tokens for ticket in _active)
+
+def tenant_excess(tenant: str, tokens: int) -> int:
+    """
+    Tokens by which reserving tokens would take the tenant past TENANT_MAX_CAPACITY_SHARE (0 if it fits).
+    Callers without an API key all share the "anonymous" tenant, so it is exempt.
+    """
+    if tenant == "anonymous":
+        return 0
+    tenant_inflight = sum(ticket.tokens for ticket in _active if ticket.tenant == tenant and ticket.expires_at > time.monotonic())
+    return max(0, tenant_inflight + tokens - int(config.PROVIDER_TOKEN_CAPACITY * config.TENANT_MAX_CAPACITY_SHARE))
+
+def _try_admit(profile: LinkedInProfile, tenant: str) -> Optional[Ticket]:
+    """Admit in full or degraded mode if it fits right now, within the tenant's share of capacity"""
+    capacity = config.PROVIDER_TOKEN_CAPACITY
+    inflight = inflight_tokens()
+    full = estimate_tokens(profile)
+    if inflight + full <= capacity * config.DEGRADE_LOAD_THRESHOLD and not tenant_excess(tenant, full):
+        ticket = Ticket(full, frozenset(), tenant)
+    else:
+        degraded = frozenset(config.DEGRADED_SECTIONS)
+        tokens = estimate_tokens(profile, degraded)
+        if inflight + tokens > capacity or tenant_excess(tenant, tokens):
+            return None
+        ticket = Ticket(tokens, degraded, tenant)
+    stats["degraded"] += int(bool(ticket.degraded_sections))
+    _active.add(ticket)
+    stats["admitted"] += 1
+    return ticket
+
+async def admit(profile: LinkedInProfile, api_key: Optional[str] = None, coalesced: bool = False,
+                tenant: str = "anonymous") -> Ticket:
+    """
+    Reserve capacity for an analysis or raise HTTPException(503), or 429 when the tenant
+    is over its share of capacity (rejected at once rather than queued).
+    Requests that attach to an identical in-flight analysis cost nothing and are always admitted.
+    """
+    if coalesced:
+        stats["coalesced"] += 1
+        return Ticket(0, frozenset(), tenant, coalesced=True)
+
+    # Blocked by its own tenant's share: waiting would hold up every other tenant behind it
+    _check_tenant_share(profile, tenant)
+    if not _waiters:
+        ticket = _try_admit(profile, tenant)
+        if ticket:
+            return ticket
+
+    excess = inflight_tokens() + estimate_tokens(profile, frozenset(config.DEGRADED_SECTIONS)) - config.PROVIDER_TOKEN_CAPACITY
+    if not is_priority(api_key) or len(_waiters) >= config.ADMISSION_QUEUE_SIZE:
+        stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis capacity exceeded, please retry shortly",
+            headers={"Retry-After": str(retry_after_seconds(excess))}
+        )
+
+    # Priority tenants wait (FIFO, bounded in size and time) for capacity to free up
+    stats["queued"] += 1
+    marker = object()
+    _waiters.append(marker)
+    deadline = time.monotonic() + config.ADMISSION_QUEUE_TIMEOUT
+    try:
+        while True:
+            if _waiters[0] is marker:
+                _check_tenant_share(profile, tenant)
+                ticket = _try_admit(profile, tenant)
+                if ticket:
+                    return ticket
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Analysis capacity exceeded, please retry shortly",
+                    headers={"Retry-After": str(retry_after_seconds(excess))}
+                )
+            try:
+                await asyncio.wait_for(_capacity_changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _waiters.remove(marker)
+        _notify()
+
+def _check_tenant_share(profile: LinkedInProfile, tenant: str):
+    """Raise HTTPException(429) if even a degraded analysis would exceed the tenant's share of capacity"""
+    excess = tenant_excess(tenant, estimate_tokens(profile, frozenset(config.DEGRADED_SECTIONS)))
+    if excess:
+        stats["tenant_rejected"] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many analyses in flight for this API key, please retry shortly",
+            headers={"Retry-After": str(retry_after_seconds(excess))}
+        )
+
+def _notify():
+    global _capacity_changed
+    _capacity_changed.set()
+    _capacity_changed = asyncio.Event()
+
+def release(ticket: Ticket):
+    """Give back a ticket's reserved capacity (safe to call more than once)"""
+    _active.discard(ticket)
+    _notify()
+
+def metrics() -> dict:
+    inflight = inflight_tokens()
+    return {
+        **stats,
+        "inflight_tokens": inflight,
+        "capacity_tokens": config.PROVIDER_TOKEN_CAPACITY,
+        "load": round(inflight / config.PROVIDER_TOKEN_CAPACITY, 4),
+        "queue_length": len(_waiters),
+    }
@@ -4,15 +4,261 @@ It includes functions for both streaming and non-streaming analysis of each prof
 """
 import json
 import asyncio
-from typing import List, AsyncGenerator, Dict
+from typing import List, AsyncGenerator, Dict, Optional, Callable, Awaitable
 
 # Import from other modules in the project
-import services
+import accounting
+import config
+import heuristics
+import router
+import semantic_cache
+import store
 import utils
+from pydantic import ValidationError
 from models import (
-    LinkedInProfile, Experience, Education, Project, Certification
+    LinkedInProfile, Experience, Education, Project, Certification,
+    UserContext, SectionFeedback
 )
 
+# Bump when prompts change: stored analyses from other template versions are not reused
+PROMPT_TEMPLATE_VERSION = "2026.11"
+
+# ==================== STRUCTURED OUTPUT MODE ====================
+# Sections that return a JSON SectionFeedback object when output_format is "structured".
+# Job match stays free-form since it covers several job descriptions in one stream.
+STRUCTURED_SECTIONS = ['headline', 'about', 'experience', 'education', 'skills', 'projects', 'certifications', 'holistic']
+STRUCTURED_MAX_TOKENS = 600
+
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
+
+Respond ONLY with a JSON object (no markdown fences, no text outside the JSON) in this exact shape:
+{"score": <integer 0-100>, "summary": "<one or two sentences>", "issues": ["<specific problem>"], "rewrites": ["<suggested replacement text>"]}
+List at most 5 issues and 3 rewrites. Be concise."""
+
+def is_structured(context: dict) -> bool:
+    return context.get('output_format') == 'structured'
+
+def with_output_format(prompt: str, max_tokens: int, context: dict) -> tuple[str, int]:
+    """Appends the JSON schema instructions and caps the token budget in structured mode"""
+    if not is_structured(context):
+        return prompt, max_tokens
+    return prompt + STRUCTURED_OUTPUT_INSTRUCTIONS, min(max_tokens, STRUCTURED_MAX_TOKENS)
+
+def missing_section(message: str, context: dict) -> str:
+    """Feedback for an empty section, as JSON in structured mode"""
+    if not is_structured(context):
+        return message
+    return SectionFeedback(score=0, summary=message).model_dump_json(exclude_defaults=True)
+
+def parse_section_feedback(text: str) -> SectionFeedback:
+    """Validate a structured section response, keeping the raw text if the model broke the schema"""
+    parsed = utils.parse_partial_json(text)
+    if parsed is None:
+        return SectionFeedback(summary=text.strip())
+    try:
+        return SectionFeedback.model_validate(parsed)
+    except ValidationError:
+        return SectionFeedback(summary=text.strip())
+
+def stream_event(section: str, chunk: str, text_so_far: str, context: dict, last_partials: dict) -> str:
+    """
+    SSE frame for a new chunk. Text mode forwards the raw chunk; structured mode
+    sends the partially parsed JSON object, and only when it has changed.
+    """
+    if not is_structured(context) or section not in STRUCTURED_SECTIONS:
+        return f"data: {json.dumps({'type': 'stream', 'section': section, 'chunk': chunk})}\n\n"
+    partial = utils.parse_partial_json(text_so_far)
+    if partial is None:
+        return ""
+    encoded = json.dumps(partial)
+    if last_partials.get(section) == encoded:
+        return ""
+    last_partials[section] = encoded
+    return f"data: {json.dumps({'type': 'partial', 'section': section, 'data': partial})}\n\n"
+
+def section_result_event(section: str, text: str, context: dict) -> str:
+    """SSE frame with the validated result of a finished section (structured mode only)"""
+    if not is_structured(context):
+        return ""
+    feedback = parse_section_feedback(text).model_dump(by_alias=True, exclude_defaults=True)
+    return f"data: {json.dumps({'type': 'section_result', 'section': section, 'data': feedback})}\n\n"
+
+def structured_results(section_analyses: Dict[str, str]) -> dict:
+    """Compact wire format for one persona: section -> SectionFeedback with short keys"""
+    return {
+        section: parse_section_feedback(text).model_dump(by_alias=True, exclude_defaults=True)
+        for section, text in section_analyses.items()
+    }
+
+def summarize_section(text: str, context: dict, limit: int = 200) -> str:
+    """Short digest of a section's feedback for the holistic prompt"""
+    if not is_structured(context):
+        return text[:limit]
+    feedback = parse_section_feedback(text)
+    score = f"score {feedback.score}/100; " if feedback.score is not None else ""
+    return f"{score}{feedback.summary} Issues: {'; '.join(feedback.issues[:3])}"[:limit]
+
+# ==================== INCREMENTAL RE-ANALYSIS ====================
+# The holistic pass only reads these sections' feedback, so it can be reused when they are.
+HOLISTIC_DEPENDS_ON = ('headline', 'about', 'experience')
+# Context fields that decide whether stored feedback still fits. The free-text ones
+# (key_strength, primary_gap, ...) change on nearly every regeneration of the context.
+CONTEXT_KEY_FIELDS = ('seniority', 'industry', 'target_audience', 'persona', 'output_format')
+
+def section_inputs(profile: LinkedInProfile) -> Dict[str, object]:
+    """The profile fields each prompt is built from, keyed by section ('context' is the context pass)"""
+    recent = profile.experiences[0] if profile.experiences else None
+    recent_role = [recent.jobTitle, recent.company] if recent else None
+    return {
+        'context': [profile.headline, profile.about[:500], len(profile.experiences), recent_role, profile.skills[:10], profile.output_format],
+        'headline': profile.headline,
+        'about': profile.about,
+        'experience': [exp.model_dump() for exp in profile.experiences],
+        'education': [edu.model_dump() for edu in profile.education],
+        'skills': profile.skills,
+        'projects': [proj.model_dump() for proj in profile.projects],
+        'certifications': [cert.model_dump() for cert in profile.certifications],
+        'job_match': [profile.is_job_seeking, profile.target_job_descriptions, profile.headline,
+                      profile.about[:400], profile.skills[:15], recent_role],
+    }
+
+def profile_key(profile: LinkedInProfile, previous_analysis_id: Optional[str] = None) -> str:
+    """Canonical hash of a request (profile, personas and options)"""
+    return utils.hash_payload([profile.model_dump(), previous_analysis_id])
+
+def flight_key(profile: LinkedInProfile, tenant: str, previous_analysis_id: Optional[str] = None) -> str:
+    """
+    Key under which identical in-flight analyses are coalesced. Scoped to the tenant,
+    since the shared run's usage, capacity and stored analysis belong to one tenant.
+    """
+    return utils.hash_payload([tenant, profile_key(profile, previous_analysis_id)])
+
+def section_fingerprints(profile: LinkedInProfile) -> Dict[str, str]:
+    return {section: utils.hash_payload(value) for section, value in section_inputs(profile).items()}
+
+def incremental_context(previous_persona: Optional[dict], context: dict) -> dict:
+    """
+    The stored context when a regenerated one agrees with it on CONTEXT_KEY_FIELDS, so that
+    stored sections stay reusable and new prompts match them; otherwise the new context.
+    """
+    if not previous_persona:
+        return context
+    previous = previous_persona['context']
+    if all(str(previous.get(field, '')).strip().lower() == str(context.get(field, '')).strip().lower() for field in CONTEXT_KEY_FIELDS):
+        return previous
+    return context
+
+def reusable_sections(previous_persona: Optional[dict], fingerprints: Dict[str, str], context: dict) -> set:
+    """Sections whose stored feedback is still valid for the new profile and context"""
+    if not previous_persona or previous_persona['context'] != context:
+        return set()
+    old_fingerprints = previous_persona['fingerprints']
+    reused = {
+        section for section in previous_persona['sections']
+        if section in fingerprints and old_fingerprints.get(section) == fingerprints[section]
+    }
+    if 'holistic' in previous_persona['sections'] and all(dep in reused for dep in HOLISTIC_DEPENDS_ON):
+        reused.add('holistic')
+    return reused
+
+def persona_record(profile: LinkedInProfile, context: dict, sections: Dict[str, str]) -> dict:
+    """What gets stored per persona so a later request can reuse it"""
+    return {'context': context, 'fingerprints': section_fingerprints(profile), 'sections': sections}
+
+def save_analysis(profile: LinkedInProfile, persona_records: dict, response: dict) -> str:
+    """Persist a finished analysis for incremental re-runs and GET /analyses/{id}"""
+    return store.save_analysis(
+        {'personas': persona_records, 'template_version': PROMPT_TEMPLATE_VERSION}, response,
+        profile_hash=profile_key(profile), tenant=accounting.current_tenant(), output_format=profile.output_format or "text"
+    )
+
+def replayed_section_events(section: str, text: str, context: dict, reason: str) -> List[str]:
+    """SSE frames sending a section that needed no LLM call in one go; reason is 'reused' or 'degraded'"""
+    events = [f"data: {json.dumps({'type': 'section_start', 'section': section, reason: True})}\n\n"]
+    if is_structured(context) and section in STRUCTURED_SECTIONS:
+        events.append(section_result_event(section, text, context))
+    else:
+        events.append(f"data: {json.dumps({'type': 'stream', 'section': section, 'chunk': text, reason: True})}\n\n")
+    return events
+
+# ==================== DEGRADED MODE ====================
+def degraded_feedback(section: str, profile: LinkedInProfile, context: dict) -> str:
+    """Feedback from local heuristics only, for sections skipped under load"""
+    findings = heuristics.run_checks(profile)[section]
+    if is_structured(context):
+        return SectionFeedback(summary="Quick check only; the detailed AI review was skipped due to high load.",
+                               issues=findings['notes']).model_dump_json(exclude_defaults=True)
+    return heuristics.section_summary(findings)
+
+# ==================== SEMANTIC CACHE ====================
+def semantic_cache_text(content) -> str:
+    """Order-insensitive text of a section's input, used for the near-duplicate lookup"""
+    if isinstance(content, str):
+        return content.strip()
+    items = [
+        " - ".join(str(value) for value in item.model_dump().values()) if hasattr(item, 'model_dump') else str(item)
+        for item in content
+    ]
+    return "\n".join(sorted(item.strip().lower() for item in items if item.strip()))
+
+def semantic_cache_namespace(section: str, context: dict) -> Optional[str]:
+    """
+    Entries are shared between requests for the same section and key context fields
+    (the only context the cached sections' prompts use); None if the section is not cached.
+    """
+    if section not in config.SEMANTIC_CACHE_SECTIONS:
+        return None
+    key_context = [str(context.get(field, '')).strip().lower() for field in CONTEXT_KEY_FIELDS]
+    return f"{section}:{utils.hash_payload(key_context)}"
+
+def cached_feedback(section: str, content, context: dict) -> Optional[str]:
+    """Semantic cache lookup for a section's input; None on a miss or if the section is not cached"""
+    namespace = semantic_cache_namespace(section, context)
+    text = semantic_cache_text(content)
+    if namespace is None or not text:
+        return None
+    return semantic_cache.cache.lookup(namespace, text)
+
+def cache_feedback(section: str, content, context: dict, feedback: str):
+    namespace = semantic_cache_namespace(section, context)
+    text = semantic_cache_text(content)
+    if namespace and text and feedback:
+        semantic_cache.cache.insert(namespace, text, feedback)
+
+async def semantic_cached_stream(section: str, content, context: dict, analyze: Callable) -> AsyncGenerator[tuple[str, str], None]:
+    """Serve a near-duplicate section from the semantic cache, otherwise stream it and cache the result"""
+    namespace = semantic_cache_namespace(section, context)
+    text = semantic_cache_text(content)
+    if namespace is None or not text:
+        async for item in analyze(content, context):
+            yield item
+        return
+    
+    cached = semantic_cache.cache.lookup(namespace, text)
+    if cached is not None:
+        yield (cached, section)
+        return
+    
+    feedback = ""
+    async for chunk, name in analyze(content, context):
+        feedback += chunk
+        yield (chunk, name)
+    semantic_cache.cache.insert(namespace, text, feedback)
+
+async def semantic_cached_call(section: str, content, context: dict, analyze: Callable[..., Awaitable[str]]) -> str:
+    """Non-streaming counterpart of semantic_cached_stream"""
+    namespace = semantic_cache_namespace(section, context)
+    text = semantic_cache_text(content)
+    if namespace is None or not text:
+        return await analyze(content, context)
+    
+    cached = semantic_cache.cache.lookup(namespace, text)
+    if cached is not None:
+        return cached
+    feedback = await analyze(content, context)
+    semantic_cache.cache.insert(namespace, text, feedback)
+    return feedback
+
 # ==================== CONTEXT DETERMINATION ====================
 async def determine_user_context(profile: LinkedInProfile, persona: str = "general") -> dict:
     """Determine user context - uses non-streaming since it's fast"""
@@ -26,6 +272,7 @@ async def determine_user_context(profile: LinkedInProfile, persona: str = "gener
     }
     
     persona_description = persona_context.get(persona, "a professional audience")
+    structured = profile.output_format == "structured"
     
     context_prompt = f"""Analyze this LinkedIn profile to determine the user's professional context, specifically optimized for {persona_description}.
 Headline: {profile.headline}
@@ -34,7 +281,7 @@ Experience: {len(profile.experiences)} positions listed
 Most Recent Role: {profile.experiences[0].jobTitle if profile.experiences else 'Not specified'} at {profile.experiences[0].company if profile.experiences else 'Not specified'}
 Skills: {', '.join(profile.skills[:10])}
 IMPORTANT: Frame your analysis considering what {persona_description} would prioritize.
-Determine and return ONLY the following in this exact format:
+Determine and return ONLY the following {'as a JSON object whose keys are the lowercase field names' if structured else 'in this exact format'}:
 SENIORITY: [Entry-level/Mid-level/Senior/Executive/C-Suite]
 INDUSTRY: [Primary industry, e.g., Technology, Healthcare, Finance]
 CAREER_GOAL: [Their apparent goal for {persona_description}: Job seeking/Career growth/Thought leadership/Networking/Entrepreneurship]
@@ -44,22 +291,25 @@ KEY_STRENGTH: [Their most obvious strength in 3-5 words]
 PRIMARY_GAP: [Most significant gap or opportunity for {persona_description} in 3-5 words]"""
     system_prompt = f"You are an expert at quickly identifying professional context for optimization targeting {persona_description}. Be precise and concise."
     
-    response = await services.call_cerebras_api(context_prompt, system_prompt, max_tokens=300)
+    response = await router.call('context', 'cerebras', context_prompt, system_prompt, max_tokens=300)
     
-    context = {
-        'seniority': 'Mid-level', 'industry': 'Technology', 'career_goal': 'Career growth',
-        'target_audience': persona, 'tone_preference': 'Professional-formal',
-        'key_strength': 'Technical skills', 'primary_gap': 'Quantifiable achievements', 'persona': persona
-    }
+    fields = {'target_audience': persona}
+    if structured:
+        parsed = utils.parse_partial_json(response) or {}
+        fields.update({key: str(value).strip() for key, value in parsed.items() if key in UserContext.model_fields and value})
+    else:
+        for line in response.split('\n'):
+            key, sep, value = line.partition(':')
+            key = key.strip(' *-#.0123456789').lower()
+            if sep and key in UserContext.model_fields and value.strip(' *'):
+                fields[key] = value.strip(' *')
     
-    for line in response.split('\n'):
-        if 'SENIORITY:' in line: context['seniority'] = line.split(':', 1)[1].strip()
-        elif 'INDUSTRY:' in line: context['industry'] = line.split(':', 1)[1].strip()
-        elif 'CAREER_GOAL:' in line: context['career_goal'] = line.split(':', 1)[1].strip()
-        elif 'TARGET_AUDIENCE:' in line: context['target_audience'] = line.split(':', 1)[1].strip()
-        elif 'TONE_PREFERENCE:' in line: context['tone_preference'] = line.split(':', 1)[1].strip()
-        elif 'KEY_STRENGTH:' in line: context['key_strength'] = line.split(':', 1)[1].strip()
-        elif 'PRIMARY_GAP:' in line: context['primary_gap'] = line.split(':', 1)[1].strip()
+    try:
+        context = UserContext(**fields).model_dump()
+    except ValidationError:
+        context = UserContext(target_audience=persona).model_dump()
+    context['persona'] = persona
+    context['output_format'] = profile.output_format or "text"
     
     return context
 
@@ -67,7 +317,7 @@ PRIMARY_GAP: [Most significant gap or opportunity for {persona_description} in 3
 async def analyze_headline_stream_two_step(headline: str, context: dict) -> AsyncGenerator[str, None]:
     """TWO-STEP SEQUENTIAL PROCESS for headline analysis: Generate → Refine"""
     if not headline.strip():
-        yield "No headline provided. A compelling headline is crucial for LinkedIn visibility."
+        yield missing_section("No headline provided. A compelling headline is crucial for LinkedIn visibility.", context)
         return
 
     generate_prompt = f"""You are a creative LinkedIn headline generator for a {context['seniority']} professional in {context['industry']}.
@@ -78,32 +328,40 @@ Context:
 - Key Strength: {context['key_strength']}
 Generate 5 alternative headline options that are under 220 characters, include relevant keywords, communicate value, are optimized for {context['target_audience']}, and match their tone.
 Format each as: OPTION 1: [headline], etc. Then provide a brief analysis of the CURRENT headline's strengths and weaknesses."""
+    headline_facts = heuristics.prompt_facts(heuristics.check_headline(headline))
+    generate_prompt += headline_facts
     generated_options = ""
-    async for chunk in services.call_cerebras_stream(generate_prompt, "You are a creative professional headline writer.", 800):
+    async for chunk in router.stream('headline_options', 'cerebras', generate_prompt, "You are a creative professional headline writer.", 800):
         generated_options += chunk
-        yield chunk
+        # In structured mode only the refined JSON is part of the section output
+        if not is_structured(context):
+            yield chunk
 
     refine_prompt = f"""You are an expert career strategist reviewing headline options for a {context['seniority']} {context['industry']} professional.
 CURRENT HEADLINE: "{headline}"
 GENERATED ALTERNATIVES: {generated_options}
 Your task is to analyze each alternative, select the TOP 2, and provide specific, actionable recommendations on what to keep, change, and add to the current headline. Be strategic and specific."""
-    async for chunk in services.call_llama_stream(refine_prompt, "You are a strategic career advisor.", 1200):
+    refine_prompt += headline_facts
+    refine_prompt, max_tokens = with_output_format(refine_prompt, 1200, context)
+    async for chunk in router.stream('headline', 'openrouter', refine_prompt, "You are a strategic career advisor.", max_tokens):
         yield chunk
 
 async def analyze_about_stream(about: str, context: dict) -> AsyncGenerator[tuple[str, str], None]:
     if not about.strip():
-        yield ("No About section provided. This is a critical section that tells your professional story.", "about")
+        yield (missing_section("No About section provided. This is a critical section that tells your professional story.", context), "about")
         return
     prompt = f"""You are the "Persona Calibrator" analyzing an About section for a {context['seniority']} professional in {context['industry']} targeting {context['target_audience']}.
 About Section: "{about}"
 Context: Goal({context['career_goal']}), Strength({context['key_strength']}), Gap({context['primary_gap']})
 Analyze this section for: Structure, Authenticity, Value Proposition, Gap Addressing, Call to Action, and Keyword Optimization. Provide detailed, personalized feedback with specific examples."""
-    async for chunk in services.call_llama_stream(prompt, "You are an expert at crafting compelling About sections.", 1500):
+    prompt += heuristics.prompt_facts(heuristics.check_about(about))
+    prompt, max_tokens = with_output_format(prompt, 1500, context)
+    async for chunk in router.stream('about', 'openrouter', prompt, "You are an expert at crafting compelling About sections.", max_tokens):
         yield (chunk, "about")
 
 async def analyze_experience_stream(experiences: List[Experience], context: dict) -> AsyncGenerator[tuple[str, str], None]:
     if not experiences or all(not exp.description.strip() for exp in experiences):
-        yield ("No experience descriptions provided. Strong descriptions are essential.", "experience")
+        yield (missing_section("No experience descriptions provided. Strong descriptions are essential.", context), "experience")
         return
     
     exp_text = "\n\n".join([
@@ -152,13 +410,15 @@ Context-Specific Evaluation:
 
 Provide specific feedback for improvement with examples tailored to {context['industry']} and {context['seniority']} level."""
     
-    async for chunk in services.call_cerebras_stream(prompt, f"You are an expert at analyzing {context['industry']} experience.", 1200):
+    prompt += heuristics.prompt_facts(heuristics.check_experience(experiences))
+    
+    prompt, max_tokens = with_output_format(prompt, 1200, context)
+    async for chunk in router.stream('experience', 'cerebras', prompt, f"You are an expert at analyzing {context['industry']} experience.", max_tokens):
         yield (chunk, "experience")
 
-async def analyze_education_stream(education: List[Education], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+def education_prompt(education: List[Education], context: dict) -> Optional[str]:
     if not education or all(not edu.degree.strip() for edu in education):
-        yield (f"No education information provided.", "education")
-        return
+        return None
     
     edu_text = "\n".join([
         f"{edu.degree} from {edu.institution}\n"
@@ -196,40 +456,165 @@ Context-Specific Evaluation:
 
 Provide brief, actionable feedback tailored to their context."""
     
-    async for chunk in services.call_cerebras_stream(prompt, f"You are an expert in {context['industry']} educational requirements.", 800):
+    return prompt + heuristics.prompt_facts(heuristics.check_education(education))
+
+async def analyze_education_stream(education: List[Education], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+    prompt = education_prompt(education, context)
+    if prompt is None:
+        yield (missing_section("No education information provided.", context), "education")
+        return
+    prompt, max_tokens = with_output_format(prompt, 800, context)
+    async for chunk in router.stream('education', 'cerebras', prompt, f"You are an expert in {context['industry']} educational requirements.", max_tokens):
         yield (chunk, "education")
 
-async def analyze_skills_stream(skills: List[str], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+def skills_prompt(skills: List[str], context: dict) -> Optional[str]:
     if not skills:
-        yield (f"No skills listed. Add 5-10 core skills relevant to {context['industry']}.", "skills")
-        return
+        return None
     skills_text = ", ".join(skills)
     prompt = f"""Analyze this skills list for a {context['seniority']} professional in {context['industry']}: {skills_text}
-Evaluate: Industry Relevance, Seniority Alignment, Career Goal Support, Balance (technical vs. soft), and how well it highlights their strength '{context['key_strength']}'. Suggest skills to add, remove, or prioritize."""
-    async for chunk in services.call_cerebras_stream(prompt, f"You are an expert in {context['industry']} skill requirements.", 1000):
+Evaluate: Industry Relevance, Seniority Alignment, Career Goal Support, and Balance (technical vs. soft). Suggest skills to add, remove, or prioritize."""
+    return prompt + heuristics.prompt_facts(heuristics.check_skills(skills))
+
+async def analyze_skills_stream(skills: List[str], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+    prompt = skills_prompt(skills, context)
+    if prompt is None:
+        yield (missing_section(f"No skills listed. Add 5-10 core skills relevant to {context['industry']}.", context), "skills")
+        return
+    prompt, max_tokens = with_output_format(prompt, 1000, context)
+    async for chunk in router.stream('skills', 'cerebras', prompt, f"You are an expert in {context['industry']} skill requirements.", max_tokens):
         yield (chunk, "skills")
 
-async def analyze_projects_stream(projects: List[Project], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+def projects_prompt(projects: List[Project], context: dict) -> Optional[str]:
     if not projects or all(not proj.name.strip() for proj in projects):
-        yield (f"No projects listed. For {context['seniority']} professionals, projects can showcase expertise.", "projects")
-        return
+        return None
     proj_text = "\n\n".join([f"Project: {proj.name}\n{proj.description}" for proj in projects if proj.name.strip()])
     prompt = f"""Analyze these project entries for a {context['seniority']} {context['industry']} professional targeting {context['target_audience']}:
 {proj_text}
 Evaluate: Industry Relevance, Audience Appeal, Strength Demonstration ('{context['key_strength']}'), Impact & Outcomes. Provide actionable feedback."""
-    async for chunk in services.call_cerebras_stream(prompt, f"You are an expert at evaluating {context['industry']} project portfolios.", 1000):
+    return prompt + heuristics.prompt_facts(heuristics.check_projects(projects))
+
+async def analyze_projects_stream(projects: List[Project], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+    prompt = projects_prompt(projects, context)
+    if prompt is None:
+        yield (missing_section(f"No projects listed. For {context['seniority']} professionals, projects can showcase expertise.", context), "projects")
+        return
+    prompt, max_tokens = with_output_format(prompt, 1000, context)
+    async for chunk in router.stream('projects', 'cerebras', prompt, f"You are an expert at evaluating {context['industry']} project portfolios.", max_tokens):
         yield (chunk, "projects")
 
-async def analyze_certifications_stream(certifications: List[Certification], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+def certifications_prompt(certifications: List[Certification], context: dict) -> Optional[str]:
     if not certifications or all(not cert.name.strip() for cert in certifications):
-        yield (f"No certifications listed. Relevant certifications can boost credibility.", "certifications")
-        return
+        return None
     cert_text = "\n".join([f"{cert.name} - {cert.organization}" for cert in certifications if cert.name.strip()])
     prompt = f"""Analyze these certifications for a {context['seniority']} {context['industry']} professional: {cert_text}
 Evaluate: Industry Relevance, Seniority Appropriateness, and support for their career goal. Suggest key certifications if any are missing."""
-    async for chunk in services.call_cerebras_stream(prompt, f"You are an expert in certifications for {context['industry']}.", 800):
+    return prompt + heuristics.prompt_facts(heuristics.check_certifications(certifications))
+
+async def analyze_certifications_stream(certifications: List[Certification], context: dict) -> AsyncGenerator[tuple[str, str], None]:
+    prompt = certifications_prompt(certifications, context)
+    if prompt is None:
+        yield (missing_section("No certifications listed. Relevant certifications can boost credibility.", context), "certifications")
+        return
+    prompt, max_tokens = with_output_format(prompt, 800, context)
+    async for chunk in router.stream('certifications', 'cerebras', prompt, f"You are an expert in certifications for {context['industry']}.", max_tokens):
         yield (chunk, "certifications")
 
+# ==================== FUSED SMALL SECTIONS ====================
+# Short sections that can share one multiplexed call: profile field, prompt builder,
+# separate streaming analysis (fallback) and its token budget
+FUSED_SECTIONS = {
+    'education': ('education', education_prompt, analyze_education_stream, 800),
+    'skills': ('skills', skills_prompt, analyze_skills_stream, 1000),
+    'projects': ('projects', projects_prompt, analyze_projects_stream, 1000),
+    'certifications': ('certifications', certifications_prompt, analyze_certifications_stream, 800),
+}
+fusion_stats = {"fused_calls": 0, "sections_fused": 0, "protocol_fallbacks": 0}
+
+FUSED_STRUCTURED_INSTRUCTIONS = """
+
+Inside each section's delimiters respond ONLY with a JSON object (no markdown fences) in this exact shape:
+{"score": <integer 0-100>, "summary": "<one or two sentences>", "issues": ["<specific problem>"], "rewrites": ["<suggested replacement text>"]}
+List at most 5 issues and 3 rewrites per section. Be concise."""
+
+def fused_prompt(prompts: Dict[str, str], context: dict) -> tuple[str, int]:
+    """One prompt asking for every section in its own delimited block, and the summed token budget"""
+    order = "\n".join(f"{utils.section_start_marker(section)}\n<feedback for {section}>\n{utils.section_end_marker(section)}" for section in prompts)
+    tasks = "\n\n".join(f"### {section.upper()}\n{prompt}" for section, prompt in prompts.items())
+    prompt = f"""Review the following {len(prompts)} sections of one LinkedIn profile. Treat each section as a separate task.
+
+Answer every section, in this order, wrapping each answer in its delimiters exactly as shown, each delimiter on its own line. Write nothing outside the delimiters.
+{order}
+
+{tasks}"""
+    if is_structured(context):
+        prompt += FUSED_STRUCTURED_INSTRUCTIONS
+    max_tokens = sum(with_output_format("", FUSED_SECTIONS[section][3], context)[1] for section in prompts)
+    return prompt, max_tokens
+
+async def fused_small_sections_stream(profile: LinkedInProfile, sections: List[str], context: dict) -> AsyncGenerator[tuple[Optional[str], str], None]:
+    """
+    Analyze several small sections with one multiplexed LLM call, routing chunks to
+    their section as they arrive. Empty and semantic-cache sections are answered
+    locally. If the model breaks the delimiter protocol, unfinished sections are
+    re-run as separate calls; a (None, section) item tells the caller to discard
+    what was already streamed for that section.
+    """
+    prompts = {}
+    for section in sections:
+        field, build_prompt, analyze, _ = FUSED_SECTIONS[section]
+        content = getattr(profile, field)
+        cached = cached_feedback(section, content, context)
+        if cached is not None:
+            yield (cached, section)
+            continue
+        prompt = build_prompt(content, context)
+        if prompt is None:
+            async for item in analyze(content, context):
+                yield item
+            continue
+        prompts[section] = prompt
+
+    async def separate(section: str):
+        field, _, analyze, _ = FUSED_SECTIONS[section]
+        content = getattr(profile, field)
+        feedback = ""
+        async for chunk, name in analyze(content, context):
+            feedback += chunk
+            yield (chunk, name)
+        cache_feedback(section, content, context, feedback)
+
+    if len(prompts) < 2:
+        # Nothing to share a call with
+        for section in prompts:
+            async for item in separate(section):
+                yield item
+        return
+
+    fusion_stats["fused_calls"] += 1
+    fusion_stats["sections_fused"] += len(prompts)
+    prompt, max_tokens = fused_prompt(prompts, context)
+    texts = {section: "" for section in prompts}
+    try:
+        upstream = router.stream('fused', 'cerebras', prompt, f"You are an expert LinkedIn profile reviewer for {context['industry']}.", max_tokens)
+        async for chunk, section in utils.demultiplex_sections(upstream, list(prompts)):
+            texts[section] += chunk
+            yield (chunk, section)
+        completed = list(prompts)
+    except utils.DelimiterProtocolError as e:
+        fusion_stats["protocol_fallbacks"] += 1
+        print(f"⚠️ Fused call broke the delimiter protocol ({e}); falling back to separate calls")
+        completed = e.completed
+    
+    for section in completed:
+        cache_feedback(section, getattr(profile, FUSED_SECTIONS[section][0]), context, texts[section])
+    retry = [section for section in prompts if section not in completed]
+    for section in retry:
+        if texts[section]:
+            yield (None, section)
+    if retry:
+        async for chunk, section, _ in utils.merge_streams(*[separate(section) for section in retry]):
+            yield (chunk, section)
+
 # ==================== JOB MATCHING ANALYSIS ====================
 async def analyze_job_match_stream(profile: LinkedInProfile, context: dict) -> AsyncGenerator[tuple[str, str], None]:
     """Analyze profile fit against target job descriptions - STREAMING"""
@@ -294,7 +679,7 @@ Be specific, actionable, and honest about fit."""
         
         yield (f"JOB MATCH ANALYSIS #{idx}\n{'='*60}\n\n", "job_match")
         
-        async for chunk in services.call_llama_stream(prompt, f"You are an expert at matching candidates to job requirements for {context['industry']} roles.", 2500):
+        async for chunk in router.stream('job_match', 'openrouter', prompt, f"You are an expert at matching candidates to job requirements for {context['industry']} roles.", 2500):
             yield (chunk, "job_match")
 
 async def generate_holistic_feedback_stream(profile: LinkedInProfile, section_analyses: dict, context: dict) -> AsyncGenerator[tuple[str, str], None]:
@@ -302,9 +687,9 @@ async def generate_holistic_feedback_stream(profile: LinkedInProfile, section_an
     summary = f"""PROFESSIONAL CONTEXT: A {context['seniority']} in {context['industry']} targeting {context['target_audience']} with goal of {context['career_goal']}.
 Strength: {context['key_strength']}. Gap: {context['primary_gap']}.
 SUMMARY OF AI FEEDBACK:
-Headline: {section_analyses['headline'][:200]}...
-About: {section_analyses['about'][:200]}...
-Experience: {section_analyses['experience'][:200]}...
+Headline: {summarize_section(section_analyses['headline'], context)}...
+About: {summarize_section(section_analyses['about'], context)}...
+Experience: {summarize_section(section_analyses['experience'], context)}...
 """
     prompt = f"""{summary}
 You are an expert career strategist. Conduct a STRATEGIC META-ANALYSIS.
@@ -314,111 +699,321 @@ You are an expert career strategist. Conduct a STRATEGIC META-ANALYSIS.
 FORMAT as a prioritized list.
 STRATEGIC PRIORITY 1: [Most critical change] Why: [Impact] How: [Action steps]
 FINAL STRATEGIC INSIGHT: [One powerful insight about their overall brand.]"""
-    async for chunk in services.call_llama_stream(prompt, "You are a master career strategist.", 2000):
+    if is_structured(context):
+        prompt += "\nPut the strategic priorities in \"issues\" and the concrete actions in \"rewrites\"."
+    prompt, max_tokens = with_output_format(prompt, 2000, context)
+    async for chunk in router.stream('holistic', 'openrouter', prompt, "You are a master career strategist.", max_tokens):
         yield (chunk, "holistic")
 
+# ==================== SECTION CONTROL (CANCEL / RE-RUN) ====================
+# Fresh (uncached) stream per section for re-runs: profile field and streaming analysis
+SECTION_STREAMS = {
+    'about': ('about', analyze_about_stream),
+    'experience': ('experiences', analyze_experience_stream),
+    **{section: (field, analyze) for section, (field, _, analyze, _) in FUSED_SECTIONS.items()},
+}
+RERUNNABLE_SECTIONS = ['headline', *SECTION_STREAMS, 'job_match', 'holistic']
+
+def section_cancelled_event(section: str) -> str:
+    return f"data: {json.dumps({'type': 'section_cancelled', 'section': section})}\n\n"
+
+async def section_stream(profile: LinkedInProfile, section: str, context: dict, section_analyses: dict) -> AsyncGenerator[tuple[str, str], None]:
+    """One section analyzed again from scratch, bypassing the semantic cache"""
+    if section == 'headline':
+        async for chunk in analyze_headline_stream_two_step(profile.headline, context):
+            yield (chunk, section)
+        return
+    if section == 'job_match':
+        stream = analyze_job_match_stream(profile, context)
+    elif section == 'holistic':
+        stream = generate_holistic_feedback_stream(profile, section_analyses, context)
+    else:
+        field, analyze = SECTION_STREAMS[section]
+        stream = analyze(getattr(profile, field), context)
+    async for item in stream:
+        yield item
+
+async def rerun_section_generator(profile: LinkedInProfile, analysis_id: str, section: str, persona: Optional[str] = None,
+                                  cancelled: Optional[set] = None):
+    """
+    Re-run one section of a stored analysis of profile and store the outcome as a new
+    analysis. Streams the same SSE events as stream_analysis_generator, starting with a
+    section_reset and ending with a rerun_complete event carrying the new analysis id.
+    """
+    cancelled = set() if cancelled is None else cancelled
+    try:
+        if section not in RERUNNABLE_SECTIONS:
+            raise Exception(f"Section '{section}' cannot be re-run")
+        record = await store.get_analysis(analysis_id, accounting.current_tenant())
+        stored = await store.get_stored_response(analysis_id)
+        if record is None or stored is None:
+            raise Exception("Analysis not found")
+        persona = persona or next(iter(record['personas']))
+        if persona not in record['personas']:
+            raise Exception(f"Persona '{persona}' is not part of this analysis")
+        previous_persona = record['personas'][persona]
+        user_context = previous_persona['context']
+        section_analyses = {k: '' for k in ['headline', 'about', 'experience']}
+        section_analyses.update(previous_persona['sections'])
+        
+        yield f"data: {json.dumps({'type': 'section_reset', 'section': section})}\n\n"
+        yield f"data: {json.dumps({'type': 'section_start', 'section': section})}\n\n"
+        text, last_partials = "", {}
+        async for chunk, _ in utils.until_cancelled(section_stream(profile, section, user_context, section_analyses), [section], cancelled):
+            text += chunk
+            event = stream_event(section, chunk, text, user_context, last_partials)
+            if event:
+                yield event
+        if section in cancelled:
+            yield section_cancelled_event(section)
+            return
+        event = section_result_event(section, text, user_context)
+        if event:
+            yield event
+        
+        personas = {**record['personas'], persona: {**previous_persona, 'sections': {**previous_persona['sections'], section: text}}}
+        results = dict(stored['response'].get('results', {}))
+        if is_structured(user_context):
+            results[persona] = {**results.get(persona, {}), **structured_results({section: text})}
+        else:
+            results[persona] = {**results.get(persona, {}), f'{section}_feedback': text}
+        new_id = save_analysis(profile, personas, {**stored['response'], 'results': results})
+        yield f"data: {json.dumps({'type': 'rerun_complete', 'section': section, 'persona': persona, 'analysis_id': new_id, 'usage': accounting.usage_summary()})}\n\n"
+        
+    except Exception as e:
+        yield f"data: {json.dumps({'type': 'error', 'message': str(e), 'section': section})}\n\n"
+
 # ==================== MAIN STREAMING GENERATOR WITH RATE LIMITING ====================
-async def stream_analysis_generator(profile: LinkedInProfile):
-    """Orchestrates the real-time streaming analysis with rate-limited parallel execution."""
+async def stream_analysis_generator(profile: LinkedInProfile, previous: Optional[dict] = None, degraded_sections=frozenset(),
+                                    cancelled: Optional[set] = None):
+    """
+    Orchestrates the real-time streaming analysis with rate-limited parallel execution.
+    When a previous stored analysis is given, sections whose inputs are unchanged are
+    replayed from it instead of calling the LLM again. degraded_sections are answered
+    from local heuristics (admission control sets them under load). Sections added to
+    cancelled while the analysis runs (WebSocket clients) are stopped or skipped for the
+    rest of the analysis and are not stored.
+    """
+    cancelled = set() if cancelled is None else cancelled
     try:
+        # Deterministic local checks go out before any LLM call
+        pre_analysis = heuristics.run_checks(profile)
+        yield f"data: {json.dumps({'type': 'pre_analysis', 'findings': pre_analysis})}\n\n"
+        if previous and previous.get('template_version') != PROMPT_TEMPLATE_VERSION:
+            previous = None
+        
         target_personas = profile.target_personas if profile.target_personas else ["general"]
         yield f"data: {json.dumps({'type': 'status', 'message': f'Starting analysis for {len(target_personas)} persona(s)'})}\n\n"
+        if degraded_sections:
+            yield f"data: {json.dumps({'type': 'status', 'message': 'High load: some sections get a quick local check only', 'degraded': sorted(degraded_sections)})}\n\n"
         all_analyses = {}
+        persona_records = {}
+        fingerprints = section_fingerprints(profile)
         
         for persona_idx, persona in enumerate(target_personas):
             try:
                 yield f"data: {json.dumps({'type': 'persona_start', 'persona': persona, 'current': persona_idx + 1, 'total': len(target_personas)})}\n\n"
                 
-                user_context = await determine_user_context(profile, persona)
+                previous_persona = previous['personas'].get(persona) if previous else None
+                if previous_persona and previous_persona['fingerprints'].get('context') == fingerprints['context']:
+                    user_context = previous_persona['context']
+                else:
+                    user_context = incremental_context(previous_persona, await determine_user_context(profile, persona))
+                reused = reusable_sections(previous_persona, fingerprints, user_context)
+                if reused:
+                    yield f"data: {json.dumps({'type': 'status', 'message': f'Reusing {len(reused)} unchanged section(s)', 'reused': sorted(reused)})}\n\n"
+                
                 section_analyses = {k: '' for k in ['headline', 'about', 'experience', 'education', 'skills', 'projects', 'certifications']}
                 sections_started = set()
+                sections_cancelled = set()
+                last_partials = {}
                 
                 # Sequential Headline Analysis (must complete first)
-                yield f"data: {json.dumps({'type': 'section_start', 'section': 'headline'})}\n\n"
                 sections_started.add('headline')
-                async for chunk in analyze_headline_stream_two_step(profile.headline, user_context):
-                    section_analyses['headline'] += chunk
-                    yield f"data: {json.dumps({'type': 'stream', 'section': 'headline', 'chunk': chunk})}\n\n"
+                if 'headline' in reused:
+                    section_analyses['headline'] = previous_persona['sections']['headline']
+                    for event in replayed_section_events('headline', section_analyses['headline'], user_context, 'reused'):
+                        yield event
+                else:
+                    if 'headline' not in cancelled:
+                        yield f"data: {json.dumps({'type': 'section_start', 'section': 'headline'})}\n\n"
+                    async for chunk in utils.until_cancelled(analyze_headline_stream_two_step(profile.headline, user_context), ['headline'], cancelled):
+                        section_analyses['headline'] += chunk
+                        event = stream_event('headline', chunk, section_analyses['headline'], user_context, last_partials)
+                        if event:
+                            yield event
+                    if 'headline' in cancelled:
+                        section_analyses['headline'] = ''
+                        sections_cancelled.add('headline')
+                        yield section_cancelled_event('headline')
+                    else:
+                        event = section_result_event('headline', section_analyses['headline'], user_context)
+                        if event:
+                            yield event
                 
                 # RATE-LIMITED PARALLEL EXECUTION
                 # Split sections into batches to avoid overwhelming the API
                 section_configs = [
-                    (analyze_about_stream(profile.about, user_context), 'about'),
-                    (analyze_experience_stream(profile.experiences, user_context), 'experience'),
-                    (analyze_education_stream(profile.education, user_context), 'education'),
-                    (analyze_skills_stream(profile.skills, user_context), 'skills'),
-                    (analyze_projects_stream(profile.projects, user_context), 'projects'),
-                    (analyze_certifications_stream(profile.certifications, user_context), 'certifications')
+                    (semantic_cached_stream('about', profile.about, user_context, analyze_about_stream), 'about'),
+                    (semantic_cached_stream('experience', profile.experiences, user_context, analyze_experience_stream), 'experience'),
+                    (semantic_cached_stream('education', profile.education, user_context, analyze_education_stream), 'education'),
+                    (semantic_cached_stream('skills', profile.skills, user_context, analyze_skills_stream), 'skills'),
+                    (semantic_cached_stream('projects', profile.projects, user_context, analyze_projects_stream), 'projects'),
+                    (semantic_cached_stream('certifications', profile.certifications, user_context, analyze_certifications_stream), 'certifications')
                 ]
                 
+                for _, section_name in section_configs:
+                    if section_name in reused:
+                        section_analyses[section_name] = previous_persona['sections'][section_name]
+                        sections_started.add(section_name)
+                        for event in replayed_section_events(section_name, section_analyses[section_name], user_context, 'reused'):
+                            yield event
+                    elif section_name in degraded_sections:
+                        section_analyses[section_name] = degraded_feedback(section_name, profile, user_context)
+                        sections_started.add(section_name)
+                        for event in replayed_section_events(section_name, section_analyses[section_name], user_context, 'degraded'):
+                            yield event
+                section_configs = [(gen, [name]) for gen, name in section_configs if name not in reused and name not in degraded_sections]
+                if config.FUSE_SMALL_SECTIONS:
+                    # The remaining small sections share one multiplexed call
+                    fused = [names[0] for _, names in section_configs if names[0] in FUSED_SECTIONS]
+                    if len(fused) > 1:
+                        section_configs = [(gen, names) for gen, names in section_configs if names[0] not in fused]
+                        section_configs.append((fused_small_sections_stream(profile, fused, user_context), fused))
+                section_configs = [(utils.until_cancelled(gen, names, cancelled), names) for gen, names in section_configs]
+                
                 # Process in batches of 3 to limit concurrent API calls
                 BATCH_SIZE = 3
                 for batch_idx in range(0, len(section_configs), BATCH_SIZE):
                     batch = section_configs[batch_idx:batch_idx + BATCH_SIZE]
                     generators = [config[0] for config in batch]
-                    section_names = [config[1] for config in batch]
+                    section_names = [name for config in batch for name in config[1]]
                     
                     # Process this batch in parallel
-                    async for chunk, section, gen_idx in utils.merge_streams(*generators):
-                        section_name = section_names[gen_idx]
+                    async for chunk, section_name, _ in utils.merge_streams(*generators):
+                        if section_name in cancelled:
+                            # Only reached by a fused call still streaming its other sections
+                            continue
+                        if chunk is None:
+                            # A fused call fell back to a separate call: drop what was streamed so far
+                            section_analyses[section_name] = ''
+                            last_partials.pop(section_name, None)
+                            yield f"data: {json.dumps({'type': 'section_reset', 'section': section_name})}\n\n"
+                            continue
                         if section_name not in sections_started:
                             yield f"data: {json.dumps({'type': 'section_start', 'section': section_name})}\n\n"
                             sections_started.add(section_name)
                         section_analyses[section_name] += chunk
-                        yield f"data: {json.dumps({'type': 'stream', 'section': section_name, 'chunk': chunk})}\n\n"
+                        event = stream_event(section_name, chunk, section_analyses[section_name], user_context, last_partials)
+                        if event:
+                            yield event
+                    
+                    for section_name in section_names:
+                        if section_name in cancelled:
+                            section_analyses[section_name] = ''
+                            sections_cancelled.add(section_name)
+                            yield section_cancelled_event(section_name)
+                            continue
+                        event = section_result_event(section_name, section_analyses[section_name], user_context)
+                        if event:
+                            yield event
 
                 # Job Match Analysis (if applicable)
                 if profile.is_job_seeking and profile.target_job_descriptions:
-                    yield f"data: {json.dumps({'type': 'section_start', 'section': 'job_match'})}\n\n"
-                    job_match_text = ""
-                    async for chunk, _ in analyze_job_match_stream(profile, user_context):
-                        job_match_text += chunk
-                        yield f"data: {json.dumps({'type': 'stream', 'section': 'job_match', 'chunk': chunk})}\n\n"
-                    section_analyses['job_match'] = job_match_text
+                    if 'job_match' in reused:
+                        section_analyses['job_match'] = previous_persona['sections']['job_match']
+                        for event in replayed_section_events('job_match', section_analyses['job_match'], user_context, 'reused'):
+                            yield event
+                    else:
+                        if 'job_match' not in cancelled:
+                            yield f"data: {json.dumps({'type': 'section_start', 'section': 'job_match'})}\n\n"
+                        job_match_text = ""
+                        async for chunk, _ in utils.until_cancelled(analyze_job_match_stream(profile, user_context), ['job_match'], cancelled):
+                            job_match_text += chunk
+                            yield f"data: {json.dumps({'type': 'stream', 'section': 'job_match', 'chunk': chunk})}\n\n"
+                        if 'job_match' in cancelled:
+                            job_match_text = ''
+                            sections_cancelled.add('job_match')
+                            yield section_cancelled_event('job_match')
+                        section_analyses['job_match'] = job_match_text
         
                 # Holistic Feedback
-                yield f"data: {json.dumps({'type': 'section_start', 'section': 'holistic'})}\n\n"
-                holistic_text = ""
-                async for chunk, _ in generate_holistic_feedback_stream(profile, section_analyses, user_context):
-                    holistic_text += chunk
-                    yield f"data: {json.dumps({'type': 'stream', 'section': 'holistic', 'chunk': chunk})}\n\n"
+                if 'holistic' in reused:
+                    holistic_text = previous_persona['sections']['holistic']
+                    for event in replayed_section_events('holistic', holistic_text, user_context, 'reused'):
+                        yield event
+                else:
+                    if 'holistic' not in cancelled:
+                        yield f"data: {json.dumps({'type': 'section_start', 'section': 'holistic'})}\n\n"
+                    holistic_text = ""
+                    async for chunk, _ in utils.until_cancelled(generate_holistic_feedback_stream(profile, section_analyses, user_context), ['holistic'], cancelled):
+                        holistic_text += chunk
+                        event = stream_event('holistic', chunk, holistic_text, user_context, last_partials)
+                        if event:
+                            yield event
+                    if 'holistic' in cancelled:
+                        holistic_text = ''
+                        sections_cancelled.add('holistic')
+                        yield section_cancelled_event('holistic')
+                    else:
+                        event = section_result_event('holistic', holistic_text, user_context)
+                        if event:
+                            yield event
                 
-                all_analyses[persona] = {**{k+'_feedback': v for k, v in section_analyses.items()}, 'holistic_feedback': holistic_text}
+                # Degraded and cancelled sections are not stored so an incremental run gives them the full analysis
+                stored_sections = {
+                    k: v for k, v in {**section_analyses, 'holistic': holistic_text}.items()
+                    if (k in reused or k not in degraded_sections) and k not in sections_cancelled
+                }
+                persona_records[persona] = persona_record(profile, user_context, stored_sections)
+                
+                if is_structured(user_context):
+                    all_analyses[persona] = structured_results({**section_analyses, 'holistic': holistic_text})
+                else:
+                    all_analyses[persona] = {**{k+'_feedback': v for k, v in section_analyses.items()}, 'holistic_feedback': holistic_text}
                 yield f"data: {json.dumps({'type': 'persona_complete', 'persona': persona})}\n\n"
                 
             except Exception as e:
                 yield f"data: {json.dumps({'type': 'error', 'message': str(e), 'trigger_fallback': True})}\n\n"
                 return
         
-        yield f"data: {json.dumps({'type': 'complete', 'results': all_analyses})}\n\n"
+        response = {'results': all_analyses, 'pre_analysis': pre_analysis, 'usage': accounting.usage_summary(), 'trace': router.request_trace()}
+        analysis_id = save_analysis(profile, persona_records, response)
+        yield f"data: {json.dumps({'type': 'complete', 'results': all_analyses, 'analysis_id': analysis_id, 'usage': response['usage'], 'trace': response['trace']})}\n\n"
         
     except Exception as e:
         yield f"data: {json.dumps({'type': 'error', 'message': str(e), 'trigger_fallback': True})}\n\n"
 
 # ==================== NON-STREAMING (FALLBACK) ANALYSIS FUNCTIONS ====================
 async def analyze_headline_non_stream(headline: str, context: dict) -> str:
-    if not headline.strip(): return "No headline provided."
+    if not headline.strip(): return missing_section("No headline provided.", context)
     generate_prompt = f"""You are a creative LinkedIn headline generator for a {context['seniority']} professional in {context['industry']}.
 Current Headline: "{headline}"
 Context: Goal({context['career_goal']}), Audience({context['target_audience']}), Strength({context['key_strength']})
 Generate 5 alternative headlines and analyze the current one."""
-    generated_options = await services.call_cerebras_api(generate_prompt, "You are a creative headline writer.", 800)
+    headline_facts = heuristics.prompt_facts(heuristics.check_headline(headline))
+    generate_prompt += headline_facts
+    generated_options = await router.call('headline_options', 'cerebras', generate_prompt, "You are a creative headline writer.", 800)
     refine_prompt = f"""You are an expert career strategist. Review these headlines:
 CURRENT: "{headline}"
 ALTERNATIVES: {generated_options}
 Select the TOP 2 alternatives and provide actionable recommendations."""
-    return await services.call_llama_api(refine_prompt, "You are a strategic career advisor.", 1200)
+    refine_prompt += headline_facts
+    refine_prompt, max_tokens = with_output_format(refine_prompt, 1200, context)
+    return await router.call('headline', 'openrouter', refine_prompt, "You are a strategic career advisor.", max_tokens)
 
 async def analyze_about_non_stream(about: str, context: dict) -> str:
-    if not about.strip(): return "No About section provided."
+    if not about.strip(): return missing_section("No About section provided.", context)
     prompt = f"""You are the "Persona Calibrator" analyzing an About section for a {context['seniority']} professional in {context['industry']} targeting {context['target_audience']}.
 About Section: "{about}"
 Analyze this section for: Structure, Authenticity, Value Proposition, Gap Addressing, Call to Action, and Keyword Optimization."""
-    return await services.call_llama_api(prompt, "You are an expert at crafting compelling About sections.", 1500)
+    prompt += heuristics.prompt_facts(heuristics.check_about(about))
+    prompt, max_tokens = with_output_format(prompt, 1500, context)
+    return await router.call('about', 'openrouter', prompt, "You are an expert at crafting compelling About sections.", max_tokens)
 
 async def analyze_experience_non_stream(experiences: List[Experience], context: dict) -> str:
     if not experiences or all(not exp.description.strip() for exp in experiences): 
-        return "No experience descriptions provided."
+        return missing_section("No experience descriptions provided.", context)
     
     exp_text = "\n\n".join([
         f"Position: {exp.jobTitle} at {exp.company}\n"
@@ -441,11 +1036,14 @@ Context-Specific Evaluation:
 
 Provide specific feedback with examples."""
     
-    return await services.call_cerebras_api(prompt, f"You are an expert at analyzing {context['industry']} experience.", 1200)
+    prompt += heuristics.prompt_facts(heuristics.check_experience(experiences))
+    
+    prompt, max_tokens = with_output_format(prompt, 1200, context)
+    return await router.call('experience', 'cerebras', prompt, f"You are an expert at analyzing {context['industry']} experience.", max_tokens)
 
 async def analyze_education_non_stream(education: List[Education], context: dict) -> str:
     if not education or all(not edu.degree.strip() for edu in education): 
-        return "No education information provided."
+        return missing_section("No education information provided.", context)
     
     edu_text = "\n".join([
         f"{edu.degree} from {edu.institution}\n"
@@ -460,28 +1058,37 @@ async def analyze_education_non_stream(education: List[Education], context: dict
 Evaluate for: Relevance to industry, Timeline alignment with career, Seniority appropriateness, and support for career goal of {context['career_goal']}.
 Provide brief, actionable feedback."""
     
-    return await services.call_cerebras_api(prompt, f"You are an expert in {context['industry']} educational requirements.", 800)
+    prompt += heuristics.prompt_facts(heuristics.check_education(education))
+    
+    prompt, max_tokens = with_output_format(prompt, 800, context)
+    return await router.call('education', 'cerebras', prompt, f"You are an expert in {context['industry']} educational requirements.", max_tokens)
 
 async def analyze_skills_non_stream(skills: List[str], context: dict) -> str:
-    if not skills: return "No skills listed."
+    if not skills: return missing_section("No skills listed.", context)
     skills_text = ", ".join(skills)
     prompt = f"""Analyze this skills list for a {context['seniority']} professional in {context['industry']}: {skills_text}
 Evaluate for industry relevance, seniority alignment, and balance."""
-    return await services.call_cerebras_api(prompt, f"You are an expert in {context['industry']} skill requirements.", 1000)
+    prompt += heuristics.prompt_facts(heuristics.check_skills(skills))
+    prompt, max_tokens = with_output_format(prompt, 1000, context)
+    return await router.call('skills', 'cerebras', prompt, f"You are an expert in {context['industry']} skill requirements.", max_tokens)
 
 async def analyze_projects_non_stream(projects: List[Project], context: dict) -> str:
-    if not projects or all(not proj.name.strip() for proj in projects): return "No projects listed."
+    if not projects or all(not proj.name.strip() for proj in projects): return missing_section("No projects listed.", context)
     proj_text = "\n\n".join([f"Project: {proj.name}\n{proj.description}" for proj in projects if proj.name.strip()])
     prompt = f"""Analyze these project entries for a {context['seniority']} {context['industry']} professional: {proj_text}
 Evaluate for relevance, audience appeal, and impact."""
-    return await services.call_cerebras_api(prompt, f"You are an expert at evaluating {context['industry']} projects.", 1000)
+    prompt += heuristics.prompt_facts(heuristics.check_projects(projects))
+    prompt, max_tokens = with_output_format(prompt, 1000, context)
+    return await router.call('projects', 'cerebras', prompt, f"You are an expert at evaluating {context['industry']} projects.", max_tokens)
 
 async def analyze_certifications_non_stream(certifications: List[Certification], context: dict) -> str:
-    if not certifications or all(not cert.name.strip() for cert in certifications): return "No certifications listed."
+    if not certifications or all(not cert.name.strip() for cert in certifications): return missing_section("No certifications listed.", context)
     cert_text = "\n".join([f"{cert.name} - {cert.organization}" for cert in certifications])
     prompt = f"""Analyze these certifications for a {context['seniority']} {context['industry']} professional: {cert_text}
 Evaluate for industry relevance and seniority appropriateness."""
-    return await services.call_cerebras_api(prompt, f"You are an expert in certifications for {context['industry']}.", 800)
+    prompt += heuristics.prompt_facts(heuristics.check_certifications(certifications))
+    prompt, max_tokens = with_output_format(prompt, 800, context)
+    return await router.call('certifications', 'cerebras', prompt, f"You are an expert in certifications for {context['industry']}.", max_tokens)
 
 async def analyze_job_match_non_stream(profile: LinkedInProfile, context: dict) -> str:
     """Analyze profile fit against target job descriptions - NON-STREAMING"""
@@ -521,7 +1128,7 @@ Perform a comprehensive job matching analysis covering:
 
 Be specific and actionable."""
         
-        analysis = await services.call_llama_api(prompt, f"You are an expert at matching candidates to {context['industry']} roles.", 2500)
+        analysis = await router.call('job_match', 'openrouter', prompt, f"You are an expert at matching candidates to {context['industry']} roles.", 2500)
         all_analyses.append(f"JOB MATCH ANALYSIS #{idx}\n{'='*60}\n\n{analysis}")
     
     return "\n\n".join(all_analyses)
@@ -529,10 +1136,11 @@ Be specific and actionable."""
 async def generate_holistic_feedback_non_stream(profile: LinkedInProfile, section_analyses: Dict, context: dict) -> str:
     summary = f"""PROFESSIONAL CONTEXT: {context['seniority']} in {context['industry']} targeting {context['target_audience']}.
 AI FEEDBACK SUMMARY:
-Headline: {section_analyses['headline'][:200]}...
-About: {section_analyses['about'][:200]}...
-Experience: {section_analyses['experience'][:200]}..."""
+Headline: {summarize_section(section_analyses['headline'], context)}...
+About: {summarize_section(section_analyses['about'], context)}...
+Experience: {summarize_section(section_analyses['experience'], context)}..."""
     prompt = f"""{summary}
 You are an expert career strategist. Conduct a STRATEGIC META-ANALYSIS.
 Analyze the analyses, assess the holistic profile for consistency, and provide 3-5 HIGH-IMPACT, prioritized recommendations."""
-    return await services.call_llama_api(prompt, "You are a master career strategist.", 2000)
\ No newline at end of file
+    prompt, max_tokens = with_output_format(prompt, 2000, context)
+    return await router.call('holistic', 'openrouter', prompt, "You are a master career strategist.", max_tokens)
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+Manual benchmark of the streaming pipeline against recorded LLM traffic.
+
+Record once against the live providers, then replay as often as needed:
+    LLM_CASSETTE_MODE=record python benchmark_replay.py profile.json
+    LLM_CASSETTE_MODE=replay LLM_REPLAY_SPEED=0 python benchmark_replay.py profile.json 20
+
+With LLM_REPLAY_SPEED=0 the time reported is orchestration overhead only.
+"""
+import asyncio
+import json
+import sys
+import time
+
+import analysis
+import cassette
+import config
+from models import LinkedInProfile
+
+async def run_once(profile: LinkedInProfile) -> dict:
+    started = time.perf_counter()
+    first_stream = None
+    events = 0
+    async for frame in analysis.stream_analysis_generator(profile):
+        events += 1
+        if first_stream is None and '"type": "stream"' in frame:
+            first_stream = time.perf_counter() - started
+    return {"total_ms": (time.perf_counter() - started) * 1000, "first_chunk_ms": (first_stream or 0) * 1000, "events": events}
+
+async def main():
+    with open(sys.argv[1]) as f:
+        profile = LinkedInProfile(**json.load(f))
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    print(f"\n⏱️ Mode: {config.LLM_CASSETTE_MODE or 'live'}, speed: {config.LLM_REPLAY_SPEED}, runs: {runs}")
+    results = [await run_once(profile) for _ in range(runs)]
+    cassette.save()
+
+    totals = sorted(r["total_ms"] for r in results)
+    print(f"✓ Events per run: {results[0]['events']}")
+    print(f"✓ Total ms: min {totals[0]:.1f}, median {totals[len(totals) // 2]:.1f}, max {totals[-1]:.1f}")
+    print(f"✓ First chunk ms (median): {sorted(r['first_chunk_ms'] for r in results)[len(results) // 2]:.1f}")
+    print(f"✓ Cassette: {cassette.metrics()}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
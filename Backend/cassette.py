@@ -0,0 +1,190 @@
+"""
+This file implements record/replay of upstream LLM traffic.
+In record mode every call made through services is captured with its chunk
+stream and inter-chunk timings into a gzipped JSON-lines cassette. In replay
+mode the cassette is served locally, at the original speed, faster, or with
+no delay at all, so benchmarks and CI runs never touch the providers.
+"""
+import asyncio
+import functools
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncGenerator, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+import accounting
+import config
+
+_recorded = []
+_replay: Optional[Dict[str, deque]] = None
+stats = {"recorded": 0, "replayed": 0, "misses": 0, "saves": 0}
+
+def _model(provider: str) -> str:
+    return {"cerebras": config.CEREBRAS_MODEL, "openrouter": config.OPENROUTER_MODEL}.get(provider, provider)
+
+def request_key(provider: str, prompt: str, system_prompt: str, max_tokens: int) -> str:
+    """Identity of an upstream request: provider, model, prompts and token limit"""
+    raw = json.dumps([provider, _model(provider), system_prompt, prompt, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+# ==================== RECORDING ====================
+def _add(entry: dict):
+    _recorded.append(entry)
+    stats["recorded"] += 1
+    if len(_recorded) >= config.LLM_CASSETTE_FLUSH_EVERY:
+        save()
+
+def save():
+    """Append the buffered entries to the cassette as one gzip member"""
+    global _recorded
+    if not _recorded:
+        return
+    entries, _recorded = _recorded, []
+    directory = os.path.dirname(config.LLM_CASSETTE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with gzip.open(config.LLM_CASSETTE_PATH, "at", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+    stats["saves"] += 1
+
+# ==================== REPLAY ====================
+def _load() -> Dict[str, deque]:
+    """Entries grouped by request key; identical requests replay their recordings in order"""
+    global _replay
+    if _replay is None:
+        _replay = {}
+        try:
+            with gzip.open(config.LLM_CASSETTE_PATH, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    # Call entries without a result or error (cancelled, written by older versions) cannot be replayed
+                    if "c" not in entry and "r" not in entry and "e" not in entry:
+                        continue
+                    _replay.setdefault(entry["k"], deque()).append(entry)
+        except FileNotFoundError:
+            print(f"⚠️ LLM cassette not found: {config.LLM_CASSETTE_PATH}")
+    return _replay
+
+def _lookup(key: str) -> Optional[dict]:
+    entries = _load().get(key)
+    if not entries:
+        stats["misses"] += 1
+        return None
+    # Rotate so repeated runs of the same request cycle through its recordings
+    entry = entries.popleft()
+    entries.append(entry)
+    stats["replayed"] += 1
+    return entry
+
+async def _pause(ms: float):
+    """Wait a recorded delay scaled by LLM_REPLAY_SPEED (0 = no delay, but still yield to the loop)"""
+    speed = config.LLM_REPLAY_SPEED
+    await asyncio.sleep(ms / 1000 / speed if speed > 0 else 0)
+
+def _replay_usage(provider: str, prompt: str, system_prompt: str, completion: str):
+    """Account a replayed call with the same local estimate used when a provider sends no usage"""
+    accounting.record(
+        provider, _model(provider), accounting.estimate_tokens(system_prompt + prompt),
+        accounting.estimate_tokens(completion), estimated=True
+    )
+
+# ==================== DECORATORS ====================
+def recorded_stream(provider: str):
+    """Record or replay a streaming service call (an async generator of text chunks)"""
+    def decorator(func: Callable[..., AsyncGenerator[str, None]]):
+        default_max_tokens = inspect.signature(func).parameters["max_tokens"].default
+
+        @functools.wraps(func)
+        async def wrapper(prompt: str, system_prompt: str, max_tokens: Optional[int] = None) -> AsyncGenerator[str, None]:
+            max_tokens = default_max_tokens if max_tokens is None else max_tokens
+            mode = config.LLM_CASSETTE_MODE
+            if mode == "replay":
+                entry = _lookup(request_key(provider, prompt, system_prompt, max_tokens))
+                if entry is None:
+                    raise Exception(f"{provider} replay error: request not in cassette")
+                completion = ""
+                for ms, chunk in entry["c"]:
+                    await _pause(ms)
+                    completion += chunk
+                    yield chunk
+                _replay_usage(provider, prompt, system_prompt, completion)
+                if "e" in entry:
+                    raise Exception(entry["e"])
+                return
+
+            if mode != "record":
+                async for chunk in func(prompt, system_prompt, max_tokens):
+                    yield chunk
+                return
+
+            entry = {"k": request_key(provider, prompt, system_prompt, max_tokens), "p": provider, "c": []}
+            generator = func(prompt, system_prompt, max_tokens)
+            try:
+                while True:
+                    # Delays measure time spent waiting on upstream only, not on our consumer
+                    started = time.perf_counter()
+                    try:
+                        chunk = await generator.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    entry["c"].append([round((time.perf_counter() - started) * 1000, 1), chunk])
+                    yield chunk
+            except GeneratorExit:
+                # Consumer went away mid-stream: an incomplete recording is not worth replaying
+                await generator.aclose()
+                raise
+            except Exception as e:
+                entry["e"] = str(e)
+                _add(entry)
+                raise
+            _add(entry)
+        return wrapper
+    return decorator
+
+def recorded_call(provider: str):
+    """Record or replay a non-streaming service call"""
+    def decorator(func: Callable[..., str]):
+        default_max_tokens = inspect.signature(func).parameters["max_tokens"].default
+
+        @functools.wraps(func)
+        async def wrapper(prompt: str, system_prompt: str, max_tokens: Optional[int] = None) -> str:
+            max_tokens = default_max_tokens if max_tokens is None else max_tokens
+            mode = config.LLM_CASSETTE_MODE
+            if mode == "replay":
+                entry = _lookup(request_key(provider, prompt, system_prompt, max_tokens))
+                if entry is None:
+                    raise HTTPException(status_code=500, detail=f"{provider} replay error: request not in cassette")
+                await _pause(entry["t"])
+                _replay_usage(provider, prompt, system_prompt, entry.get("r", ""))
+                if "e" in entry:
+                    raise HTTPException(status_code=500, detail=entry["e"])
+                return entry["r"]
+
+            if mode != "record":
+                return await func(prompt, system_prompt, max_tokens)
+
+            entry = {"k": request_key(provider, prompt, system_prompt, max_tokens), "p": provider}
+            started = time.perf_counter()
+            # Only completed calls are recorded; a cancelled one (client gone) has no outcome to replay
+            try:
+                entry["r"] = await func(prompt, system_prompt, max_tokens)
+            except HTTPException as e:
+                entry["e"] = e.detail
+                entry["t"] = round((time.perf_counter() - started) * 1000, 1)
+                _add(entry)
+                raise
+            entry["t"] = round((time.perf_counter() - started) * 1000, 1)
+            _add(entry)
+            return entry["r"]
+        return wrapper
+    return decorator
+
+def metrics() -> dict:
+    return {**stats, "mode": config.LLM_CASSETTE_MODE or "off", "buffered": len(_recorded)}
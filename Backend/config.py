@@ -12,4 +12,84 @@ load_dotenv()
 CEREBRAS_API_KEY = os.getenv("CEREBRAS_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 CEREBRAS_API_URL = "https://api.cerebras.ai/v1/chat/completions"
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
\ No newline at end of file
+OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+CEREBRAS_MODEL = "llama-4-scout-17b-16e-instruct"
+OPENROUTER_MODEL = "meta-llama/llama-3.3-8b-instruct:free"
+
+# USD per million (prompt, completion) tokens, used for cost accounting
+MODEL_PRICING_PER_MTOK = {
+    CEREBRAS_MODEL: (0.65, 0.85),
+    OPENROUTER_MODEL: (0.0, 0.0),
+}
+
+# Persistent analysis store (served by GET /analyses/{id} and used for incremental re-analysis).
+# Compaction keeps at most MAX_STORED_ANALYSES rows, none older than ANALYSIS_RETENTION_DAYS
+ANALYSIS_DB_PATH = os.getenv("ANALYSIS_DB_PATH", "analyses.db")
+MAX_STORED_ANALYSES = int(os.getenv("MAX_STORED_ANALYSES", "10000"))
+ANALYSIS_RETENTION_DAYS = float(os.getenv("ANALYSIS_RETENTION_DAYS", "30"))
+ANALYSIS_COMPACT_EVERY = int(os.getenv("ANALYSIS_COMPACT_EVERY", "100"))
+# Recent analyses also kept in memory
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "200"))
+
+# Semantic cache for near-duplicate sections (bootcamp cohorts, template certification lists, ...)
+# Entries are keyed by seniority, industry, audience and output format only, so list only sections
+# whose prompts use no free-text context (key strength, primary gap)
+SEMANTIC_CACHE_SECTIONS = [s.strip() for s in os.getenv("SEMANTIC_CACHE_SECTIONS", "skills,certifications").split(",") if s.strip()]
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2000"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+# Admission control: estimated tokens that may be in flight across all requests
+PROVIDER_TOKEN_CAPACITY = int(os.getenv("PROVIDER_TOKEN_CAPACITY", "400000"))
+PROVIDER_TOKENS_PER_SECOND = int(os.getenv("PROVIDER_TOKENS_PER_SECOND", "5000"))
+# Above this share of capacity, new requests skip DEGRADED_SECTIONS (served from local heuristics)
+DEGRADE_LOAD_THRESHOLD = float(os.getenv("DEGRADE_LOAD_THRESHOLD", "0.7"))
+DEGRADED_SECTIONS = [s.strip() for s in os.getenv("DEGRADED_SECTIONS", "education,certifications").split(",") if s.strip()]
+# API keys of paying tenants; they queue briefly instead of being rejected when at capacity
+PRIORITY_API_KEYS = {k.strip() for k in os.getenv("PRIORITY_API_KEYS", "").split(",") if k.strip()}
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "20"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_TICKET_TTL = float(os.getenv("ADMISSION_TICKET_TTL", "600"))
+# Largest share of capacity one tenant may hold at once, so batch users cannot starve interactive ones
+TENANT_MAX_CAPACITY_SHARE = float(os.getenv("TENANT_MAX_CAPACITY_SHARE", "0.5"))
+
+# Token accounting and quotas. API_KEY_TENANTS maps keys to tenant names ("key1:acme,key2:beta")
+API_KEY_TENANTS = dict(pair.split(":", 1) for pair in os.getenv("API_KEY_TENANTS", "").split(",") if ":" in pair)
+TENANT_DAILY_TOKEN_QUOTAS = {tenant: int(quota) for tenant, quota in (pair.split(":", 1) for pair in os.getenv("TENANT_DAILY_TOKEN_QUOTAS", "").split(",") if ":" in pair)}
+DEFAULT_DAILY_TOKEN_QUOTA = int(os.getenv("DEFAULT_DAILY_TOKEN_QUOTA", "0"))  # 0 = unlimited
+ACCOUNTING_DB_PATH = os.getenv("ACCOUNTING_DB_PATH", "usage.db")
+ACCOUNTING_FLUSH_BATCH = int(os.getenv("ACCOUNTING_FLUSH_BATCH", "50"))
+ACCOUNTING_FLUSH_INTERVAL = float(os.getenv("ACCOUNTING_FLUSH_INTERVAL", "30"))
+
+# Record/replay of upstream LLM traffic: "record" captures every call into the cassette,
+# "replay" serves it without network access. LLM_REPLAY_SPEED: 1 = original timing, 4 = 4x faster, 0 = no delay
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "").strip().lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "cassettes/llm_traffic.jsonl.gz")
+LLM_CASSETTE_FLUSH_EVERY = int(os.getenv("LLM_CASSETTE_FLUSH_EVERY", "50"))
+LLM_REPLAY_SPEED = float(os.getenv("LLM_REPLAY_SPEED", "1"))
+
+# Fused mode: education, skills, projects and certifications share one multiplexed streaming call
+FUSE_SMALL_SECTIONS = os.getenv("FUSE_SMALL_SECTIONS", "false").strip().lower() in ("1", "true", "yes")
+
+# Model routing: per-section provider choice from live latency/error stats, input size and cost
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+CRITICAL_SECTIONS = {s.strip() for s in os.getenv("CRITICAL_SECTIONS", "context,headline,headline_options,about,experience,fused,job_match,holistic").split(",") if s.strip()}
+PROVIDER_CONTEXT_TOKENS = {"cerebras": int(os.getenv("CEREBRAS_CONTEXT_TOKENS", "8192")), "openrouter": int(os.getenv("OPENROUTER_CONTEXT_TOKENS", "131072"))}
+# Worst-case USD per call; 0 = no ceiling
+ROUTING_COST_CEILING_USD = float(os.getenv("ROUTING_COST_CEILING_USD", "0"))
+ROUTING_NONCRITICAL_COST_CEILING_USD = float(os.getenv("ROUTING_NONCRITICAL_COST_CEILING_USD", "0"))
+# How many milliseconds of expected latency one cent is worth (non-critical sections only).
+# 0 = route on latency and errors alone; a positive weight moves cheap sections to cheaper models
+ROUTING_MS_PER_CENT = float(os.getenv("ROUTING_MS_PER_CENT", "0"))
+ROUTING_ERROR_PENALTY = float(os.getenv("ROUTING_ERROR_PENALTY", "3"))
+ROUTING_SWITCH_MARGIN = float(os.getenv("ROUTING_SWITCH_MARGIN", "0.25"))
+ROUTING_MIN_GAIN_MS = float(os.getenv("ROUTING_MIN_GAIN_MS", "100"))
+ROUTING_EXPECTED_OUTPUT_SHARE = float(os.getenv("ROUTING_EXPECTED_OUTPUT_SHARE", "0.5"))
+ROUTING_WINDOW = int(os.getenv("ROUTING_WINDOW", "100"))
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "5"))
+ROUTING_STICKY_SECONDS = float(os.getenv("ROUTING_STICKY_SECONDS", "120"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+# WebSocket transport (/ws/analyze): one socket carries consecutive analyses, at most this many waiting
+WEBSOCKET_ENABLED = os.getenv("WEBSOCKET_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+WEBSOCKET_MAX_QUEUED_JOBS = int(os.getenv("WEBSOCKET_MAX_QUEUED_JOBS", "4"))
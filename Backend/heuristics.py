@@ -0,0 +1,215 @@
+"""
+This file contains the local pre-analysis engine.
+It runs deterministic checks on a LinkedIn profile (lengths, tenure, gaps,
+metrics, action verbs, duplicates) before any LLM call. The findings are
+streamed to the client immediately and injected into the prompts so the
+model does not spend tokens rediscovering them.
+"""
+import re
+import time
+from datetime import date, datetime
+from typing import List, Optional
+
+from models import LinkedInProfile, Experience, Education, Project, Certification
+
+HEADLINE_MAX_CHARS = 220
+ABOUT_MAX_CHARS = 2600
+SHORT_STINT_MONTHS = 6
+LONG_TENURE_MONTHS = 60
+GAP_MONTHS = 3
+MIN_SKILLS = 5
+MAX_SKILLS = 50
+
+DATE_FORMATS = ["%Y-%m", "%Y-%m-%d", "%m/%Y", "%b %Y", "%B %Y", "%Y"]
+
+ACTION_VERBS = {
+    "achieved", "accelerated", "architected", "automated", "boosted", "built", "championed", "created",
+    "cut", "delivered", "designed", "developed", "drove", "engineered", "established", "expanded",
+    "generated", "grew", "implemented", "improved", "increased", "launched", "led", "managed",
+    "mentored", "migrated", "negotiated", "optimized", "orchestrated", "owned", "pioneered", "reduced",
+    "redesigned", "scaled", "shipped", "spearheaded", "streamlined", "transformed", "won",
+}
+WEAK_PHRASES = ["responsible for", "worked on", "helped with", "assisted", "duties included", "tasked with"]
+CALL_TO_ACTION = re.compile(r"\b(reach out|connect|contact|email|message me|let's|get in touch|dm)\b", re.IGNORECASE)
+
+# Money, percentages, multipliers and plain numbers that are not years
+METRIC_PATTERN = re.compile(
+    r"[$€£]\s?\d[\d,.]*\s*[kmb]?\b"
+    r"|\d[\d,.]*\s*(?:%|percent\b|x\b|\+|k\b|million\b|billion\b)"
+    r"|\b(?!(?:19|20)\d{2}\b)\d{2,}[\d,.]*\b",
+    re.IGNORECASE
+)
+
+# ==================== HELPERS ====================
+def parse_month(value: Optional[str]) -> Optional[date]:
+    """Parse the month-level dates sent by the frontend ("2021-04"); None for Present/empty/unknown"""
+    if not value or value.strip().lower() in ("present", "current", "now"):
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value.strip(), fmt)
+            return date(parsed.year, parsed.month, 1)
+        except ValueError:
+            continue
+    return None
+
+def months_between(start: date, end: date) -> int:
+    return max(0, (end.year - start.year) * 12 + end.month - start.month)
+
+def count_metrics(text: str) -> int:
+    return len(METRIC_PATTERN.findall(text))
+
+def duplicates(values: List[str]) -> List[str]:
+    """Case- and whitespace-insensitive duplicates, reported in their first spelling"""
+    seen, dupes = {}, []
+    for value in values:
+        key = " ".join(value.lower().split())
+        if key in seen and seen[key] not in dupes:
+            dupes.append(seen[key])
+        seen.setdefault(key, value.strip())
+    return dupes
+
+def description_lines(description: str) -> List[str]:
+    """Non-empty description lines with their bullet marker removed"""
+    lines = (line.strip().lstrip("-•*▪·").strip() for line in description.splitlines())
+    return [line for line in lines if line]
+
+# ==================== SECTION CHECKS ====================
+def check_headline(headline: str) -> dict:
+    length = len(headline.strip())
+    notes = [f"Headline is {length}/{HEADLINE_MAX_CHARS} characters."]
+    if length > HEADLINE_MAX_CHARS:
+        notes.append(f"Headline exceeds the {HEADLINE_MAX_CHARS}-character limit by {length - HEADLINE_MAX_CHARS} and will be truncated.")
+    elif 0 < length < 60:
+        notes.append("Headline uses less than a third of the available space.")
+    return {"length": length, "over_limit": length > HEADLINE_MAX_CHARS, "words": len(headline.split()), "notes": notes}
+
+def check_about(about: str) -> dict:
+    length = len(about.strip())
+    metrics = count_metrics(about)
+    has_cta = bool(CALL_TO_ACTION.search(about))
+    notes = [f"About is {length}/{ABOUT_MAX_CHARS} characters ({len(about.split())} words) with {metrics} quantified figure(s)."]
+    if length > ABOUT_MAX_CHARS:
+        notes.append(f"About exceeds the {ABOUT_MAX_CHARS}-character limit.")
+    if not has_cta:
+        notes.append("No call to action detected.")
+    return {"length": length, "words": len(about.split()), "metrics": metrics, "has_call_to_action": has_cta, "notes": notes}
+
+def check_experience(experiences: List[Experience], today: Optional[date] = None) -> dict:
+    today = today or date.today()
+    positions, spans = [], []
+    bullets = action_bullets = weak_phrases = metrics = 0
+
+    for exp in experiences:
+        start = parse_month(exp.startDate)
+        end = today if exp.isCurrent else (parse_month(exp.endDate) or today)
+        months = months_between(start, end) if start else None
+        positions.append({"title": exp.jobTitle, "company": exp.company, "months": months, "current": exp.isCurrent or end == today})
+        if start:
+            spans.append((start, end, exp))
+
+        lines = description_lines(exp.description)
+        bullets += len(lines)
+        action_bullets += sum(1 for line in lines if line.split()[0].lower().strip(",.:;") in ACTION_VERBS)
+        weak_phrases += sum(exp.description.lower().count(phrase) for phrase in WEAK_PHRASES)
+        metrics += count_metrics(exp.description)
+
+    gaps = []
+    spans.sort(key=lambda span: span[0])
+    for (_, prev_end, prev), (next_start, _, nxt) in zip(spans, spans[1:]):
+        gap = months_between(prev_end, next_start)
+        if gap >= GAP_MONTHS:
+            gaps.append({"after": prev.company, "before": nxt.company, "months": gap})
+
+    dated = [p["months"] for p in positions if p["months"] is not None]
+    short_stints = [p for p in positions if p["months"] is not None and p["months"] < SHORT_STINT_MONTHS and not p["current"]]
+    long_tenures = [p for p in positions if p["months"] is not None and p["months"] >= LONG_TENURE_MONTHS]
+
+    notes = [
+        "Tenure: " + "; ".join(
+            f"{p['title']} at {p['company']}: {p['months']} months" if p["months"] is not None else f"{p['title']} at {p['company']}: unparseable dates"
+            for p in positions
+        ) + "." if positions else "No positions listed.",
+        f"{action_bullets}/{bullets} description lines start with a strong action verb; {metrics} quantified figure(s); {weak_phrases} weak phrase(s) such as 'responsible for'.",
+    ]
+    if dated:
+        notes.append(f"Average tenure {sum(dated) // len(dated)} months, total {sum(dated)} months.")
+    for gap in gaps:
+        notes.append(f"Employment gap of {gap['months']} months between {gap['after']} and {gap['before']}.")
+    if short_stints:
+        notes.append(f"{len(short_stints)} position(s) shorter than {SHORT_STINT_MONTHS} months.")
+    if long_tenures:
+        notes.append(f"{len(long_tenures)} position(s) of {LONG_TENURE_MONTHS // 12}+ years.")
+
+    return {
+        "positions": positions, "gaps": gaps, "short_stints": len(short_stints), "long_tenures": len(long_tenures),
+        "bullets": bullets, "action_verb_bullets": action_bullets, "weak_phrases": weak_phrases, "metrics": metrics,
+        "notes": notes,
+    }
+
+def check_education(education: List[Education]) -> dict:
+    undated = [edu.degree for edu in education if not parse_month(edu.startDate)]
+    notes = [f"{len(education)} education entr{'y' if len(education) == 1 else 'ies'}."]
+    if undated:
+        notes.append(f"Missing or unparseable dates for: {', '.join(undated)}.")
+    return {"entries": len(education), "undated": undated, "notes": notes}
+
+def check_skills(skills: List[str]) -> dict:
+    cleaned = [skill for skill in skills if skill.strip()]
+    dupes = duplicates(cleaned)
+    notes = [f"{len(cleaned)} skills listed ({len(cleaned) - len(dupes)} unique)."]
+    if dupes:
+        notes.append(f"Duplicate skills: {', '.join(dupes)}.")
+    if len(cleaned) < MIN_SKILLS:
+        notes.append(f"Fewer than {MIN_SKILLS} skills.")
+    elif len(cleaned) > MAX_SKILLS:
+        notes.append(f"More than {MAX_SKILLS} skills dilutes the list.")
+    return {"count": len(cleaned), "duplicates": dupes, "notes": notes}
+
+def check_projects(projects: List[Project]) -> dict:
+    named = [proj for proj in projects if proj.name.strip()]
+    undescribed = [proj.name for proj in named if not proj.description.strip()]
+    metrics = sum(count_metrics(proj.description) for proj in named)
+    notes = [f"{len(named)} project(s) with {metrics} quantified figure(s)."]
+    if undescribed:
+        notes.append(f"No description for: {', '.join(undescribed)}.")
+    return {"count": len(named), "undescribed": undescribed, "metrics": metrics, "notes": notes}
+
+def check_certifications(certifications: List[Certification]) -> dict:
+    named = [cert for cert in certifications if cert.name.strip()]
+    dupes = duplicates([cert.name for cert in named])
+    no_issuer = [cert.name for cert in named if not cert.organization.strip()]
+    notes = [f"{len(named)} certification(s)."]
+    if dupes:
+        notes.append(f"Duplicate certifications: {', '.join(dupes)}.")
+    if no_issuer:
+        notes.append(f"Missing issuing organization for: {', '.join(no_issuer)}.")
+    return {"count": len(named), "duplicates": dupes, "missing_organization": no_issuer, "notes": notes}
+
+# ==================== ENTRY POINTS ====================
+def run_checks(profile: LinkedInProfile) -> dict:
+    """Run every section check; returns findings keyed by section plus the elapsed time"""
+    started = time.perf_counter()
+    findings = {
+        "headline": check_headline(profile.headline),
+        "about": check_about(profile.about),
+        "experience": check_experience(profile.experiences),
+        "education": check_education(profile.education),
+        "skills": check_skills(profile.skills),
+        "projects": check_projects(profile.projects),
+        "certifications": check_certifications(profile.certifications),
+    }
+    findings["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return findings
+
+def prompt_facts(section_findings: dict) -> str:
+    """Prompt suffix listing a section's verified findings"""
+    if not section_findings.get("notes"):
+        return ""
+    facts = "\n".join(f"- {note}" for note in section_findings["notes"])
+    return f"\n\nPRE-COMPUTED FACTS (measured exactly; treat as correct, do not recount or restate them, build on them):\n{facts}"
+
+def section_summary(section_findings: dict) -> str:
+    """Readable feedback built only from local findings, used when the LLM pass is skipped under load"""
+    notes = "\n".join(f"- {note}" for note in section_findings.get("notes", []))
+    return f"Quick check (the detailed AI review was skipped due to high load; re-run later for full feedback):\n{notes}"
@@ -3,17 +3,43 @@ This is the main entry point for the FastAPI application.
 It sets up the app, defines the API endpoints, and connects the
 routing to the core logic in the other modules.
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, JSONResponse
 import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Callable, Optional
 
 # Import from other modules in the project
+import accounting
+import admission
 import analysis
-from models import LinkedInProfile, AnalysisResponse, PersonaAnalysisResponse
+import cassette
+import config
+import heuristics
+import router
+import semantic_cache
+import singleflight
+import store
+import ws_session
+from models import (
+    LinkedInProfile, AnalysisResponse, PersonaAnalysisResponse, StructuredAnalysisResponse,
+    IncrementalAnalysisRequest
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Apply retention to whatever is left from previous runs
+    store.compact()
+    yield
+    # Persist usage counters and recorded LLM traffic that have not been flushed yet
+    accounting.maybe_flush(force=True, wait=True)
+    cassette.save()
 
 # Initialize the FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS (Cross-Origin Resource Sharing)
 app.add_middleware(
@@ -25,14 +51,86 @@ app.add_middleware(
 )
 
 
+def analysis_stream(key: str, ticket: admission.Ticket, start: Callable[[admission.Ticket], AsyncGenerator[str, None]],
+                    profile: LinkedInProfile, api_key: Optional[str], tenant: str) -> AsyncGenerator[str, None]:
+    """
+    Frames of the shared analysis for key, started with start(ticket) if nobody else has.
+    A request admitted as coalesced only attaches: if the flight ended before this stream
+    began, it goes through admission again before starting its own analysis.
+    """
+    async def frames():
+        nonlocal ticket
+        if ticket.coalesced:
+            attached = False
+            async for frame in singleflight.stream(key, None):
+                attached = True
+                yield frame
+            if attached:
+                return
+            try:
+                ticket = await admission.admit(profile, api_key, coalesced=singleflight.in_flight(key), tenant=tenant)
+            except HTTPException as e:
+                yield f"data: {json.dumps({'type': 'error', 'message': e.detail, 'trigger_fallback': True})}\n\n"
+                return
+        admitted = ticket
+        async for frame in singleflight.stream(
+            key, None if admitted.coalesced else lambda: start(admitted), on_done=lambda: admission.release(admitted)
+        ):
+            yield frame
+    return frames()
+
 @app.post("/analyze-stream")
-async def analyze_profile_stream(profile: LinkedInProfile):
+async def analyze_profile_stream(profile: LinkedInProfile, api_key: Optional[str] = Header(None, alias="X-API-Key")):
     """
     Real-time streaming analysis endpoint.
     It takes a LinkedIn profile and streams back the analysis as it's generated.
+    Identical requests already in flight share one upstream analysis.
+    """
+    tenant = accounting.tenant_for(api_key)
+    key = analysis.flight_key(profile, tenant)
+    accounting.check_quota(tenant)
+    ticket = await admission.admit(profile, api_key, coalesced=singleflight.in_flight(key), tenant=tenant)
+    return StreamingResponse(
+        analysis_stream(
+            key, ticket,
+            lambda admitted: accounting.attributed_stream(
+                accounting.start_request(tenant),
+                analysis.stream_analysis_generator(profile, degraded_sections=admitted.degraded_sections)
+            ),
+            profile, api_key, tenant
+        ),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.post("/analyze-incremental")
+async def analyze_profile_incremental(request: IncrementalAnalysisRequest, api_key: Optional[str] = Header(None, alias="X-API-Key")):
     """
+    Streaming re-analysis of an edited profile.
+    Sections whose inputs did not change since the previous analysis are replayed
+    from it; only changed sections and the passes that depend on them call the LLM.
+    """
+    tenant = accounting.tenant_for(api_key)
+    previous = await store.get_analysis(request.previous_analysis_id, tenant)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Previous analysis not found")
+    
+    key = analysis.flight_key(request.profile, tenant, request.previous_analysis_id)
+    accounting.check_quota(tenant)
+    ticket = await admission.admit(request.profile, api_key, coalesced=singleflight.in_flight(key), tenant=tenant)
     return StreamingResponse(
-        analysis.stream_analysis_generator(profile),
+        analysis_stream(
+            key, ticket,
+            lambda admitted: accounting.attributed_stream(
+                accounting.start_request(tenant),
+                analysis.stream_analysis_generator(request.profile, previous, admitted.degraded_sections)
+            ),
+            request.profile, api_key, tenant
+        ),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -41,41 +139,103 @@ async def analyze_profile_stream(profile: LinkedInProfile):
         }
     )
 
+def build_analysis_response(output_format: str, all_analyses: dict, analysis_id: str, pre_analysis: dict,
+                            usage: Optional[dict] = None, trace: Optional[list] = None):
+    """AnalysisResponse, or the compact structured payload when output_format is "structured"."""
+    if output_format == "structured":
+        # Validate, then send short keys and drop empty fields to keep the payload small
+        response = StructuredAnalysisResponse.model_validate({'results': all_analyses, 'analysis_id': analysis_id, 'pre_analysis': pre_analysis, 'usage': usage, 'trace': trace})
+        return JSONResponse(content=response.model_dump(by_alias=True, exclude_defaults=True))
+    
+    return AnalysisResponse(results=all_analyses, analysis_id=analysis_id, pre_analysis=pre_analysis, usage=usage, trace=trace)
+
+async def result_from_stream(key: str, profile: LinkedInProfile):
+    """
+    Wait for an identical /analyze-stream request that is already running and build the
+    response from its 'complete' event. Returns None if there is none or it failed.
+    """
+    pre_analysis, complete = None, None
+    async for frame in singleflight.stream(key, None):
+        event = json.loads(frame[len("data: "):])
+        if event['type'] == 'pre_analysis':
+            pre_analysis = event['findings']
+        elif event['type'] == 'complete':
+            complete = event
+    if complete is None:
+        return None
+    return build_analysis_response(profile.output_format, complete['results'], complete['analysis_id'], pre_analysis, complete.get('usage'), complete.get('trace'))
+
 @app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_profile(profile: LinkedInProfile):
+async def analyze_profile(profile: LinkedInProfile, api_key: Optional[str] = Header(None, alias="X-API-Key")):
     """
     Non-streaming fallback endpoint.
     This performs the entire analysis and returns the complete result at once.
+    With output_format="structured" the response uses the compact StructuredAnalysisResponse shape.
+    """
+    tenant = accounting.tenant_for(api_key)
+    key = analysis.flight_key(profile, tenant)
+    # The frontend falls back to /analyze while its stream may still be running
+    if singleflight.in_flight(key):
+        streamed = await result_from_stream(key, profile)
+        if streamed is not None:
+            return streamed
+    
+    accounting.check_quota(tenant)
+    ticket = await admission.admit(profile, api_key, coalesced=singleflight.call_in_flight(key), tenant=tenant)
+    try:
+        return await singleflight.call(key, lambda: accounting.attributed_call(
+            accounting.start_request(tenant), run_analysis(profile, ticket.degraded_sections)
+        ))
+    finally:
+        admission.release(ticket)
+
+async def run_analysis(profile: LinkedInProfile, degraded_sections=frozenset()):
+    """
+    Performs the full non-streaming analysis for every target persona.
+    degraded_sections are answered from local heuristics (admission control sets them under load).
     """
     try:
         target_personas = profile.target_personas if profile.target_personas else ["general"]
+        pre_analysis = heuristics.run_checks(profile)
         all_analyses = {}
+        persona_records = {}
         
         for persona in target_personas:
             user_context = await analysis.determine_user_context(profile, persona)
             
             # Run all section analyses in parallel
-            tasks = [
-                analysis.analyze_headline_non_stream(profile.headline, user_context),
-                analysis.analyze_about_non_stream(profile.about, user_context),
-                analysis.analyze_experience_non_stream(profile.experiences, user_context),
-                analysis.analyze_education_non_stream(profile.education, user_context),
-                analysis.analyze_skills_non_stream(profile.skills, user_context),
-                analysis.analyze_projects_non_stream(profile.projects, user_context),
-                analysis.analyze_certifications_non_stream(profile.certifications, user_context),
+            section_inputs = {
+                'about': (profile.about, analysis.analyze_about_non_stream),
+                'experience': (profile.experiences, analysis.analyze_experience_non_stream),
+                'education': (profile.education, analysis.analyze_education_non_stream),
+                'skills': (profile.skills, analysis.analyze_skills_non_stream),
+                'projects': (profile.projects, analysis.analyze_projects_non_stream),
+                'certifications': (profile.certifications, analysis.analyze_certifications_non_stream),
+            }
+            section_keys = ['headline'] + [key for key in section_inputs if key not in degraded_sections]
+            tasks = [analysis.analyze_headline_non_stream(profile.headline, user_context)] + [
+                analysis.semantic_cached_call(key, section_inputs[key][0], user_context, section_inputs[key][1])
+                for key in section_keys[1:]
             ]
             if profile.is_job_seeking and profile.target_job_descriptions:
                 tasks.append(analysis.analyze_job_match_non_stream(profile, user_context))
+                section_keys.append('job_match')
 
             results = await asyncio.gather(*tasks, return_exceptions=True)
             
-            section_keys = ['headline', 'about', 'experience', 'education', 'skills', 'projects', 'certifications']
-            if profile.is_job_seeking and profile.target_job_descriptions:
-                section_keys.append('job_match')
             section_analyses = {key: (res if not isinstance(res, Exception) else f"Analysis failed: {str(res)}") for key, res in zip(section_keys, results)}
+            # Degraded sections are answered locally and, like failures, not stored
+            section_analyses.update({key: analysis.degraded_feedback(key, profile, user_context) for key in section_inputs if key in degraded_sections})
 
             # Generate holistic feedback based on section analyses
             holistic_feedback = await analysis.generate_holistic_feedback_non_stream(profile, section_analyses, user_context)
+            # Failed sections are not stored so an incremental run retries them
+            succeeded = {key: section_analyses[key] for key, res in zip(section_keys, results) if not isinstance(res, Exception)}
+            persona_records[persona] = analysis.persona_record(profile, user_context, {**succeeded, 'holistic': holistic_feedback})
+            
+            if analysis.is_structured(user_context):
+                all_analyses[persona] = analysis.structured_results({**section_analyses, 'holistic': holistic_feedback})
+                continue
             
             # Store the complete analysis for this persona
             all_analyses[persona] = PersonaAnalysisResponse(
@@ -90,11 +250,69 @@ async def analyze_profile(profile: LinkedInProfile):
                 job_match_feedback=section_analyses.get('job_match', "")
             )
         
-        return AnalysisResponse(results=all_analyses)
+        response = {'results': jsonable_encoder(all_analyses), 'pre_analysis': pre_analysis, 'usage': accounting.usage_summary(), 'trace': router.request_trace()}
+        analysis_id = analysis.save_analysis(profile, persona_records, response)
+        return build_analysis_response(profile.output_format, all_analyses, analysis_id, pre_analysis, response['usage'], response['trace'])
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.get("/analyses/{analysis_id}")
+async def get_stored_analysis(analysis_id: str, api_key: Optional[str] = Header(None, alias="X-API-Key")):
+    """
+    A previously completed analysis, served from the store without any LLM call.
+    Same shape as the /analyze response. Without an API key the random analysis id
+    is the only credential, as for /analyze-incremental and WebSocket re-runs.
+    """
+    stored = await store.get_stored_response(analysis_id)
+    if stored is None or stored['tenant'] != accounting.tenant_for(api_key):
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    response = stored['response']
+    return build_analysis_response(
+        stored['output_format'], response.get('results', {}), analysis_id, response.get('pre_analysis'),
+        response.get('usage'), response.get('trace')
+    )
+
+@app.get("/analyses")
+async def list_stored_analyses(profile_hash: Optional[str] = None, persona: Optional[str] = None, limit: int = Query(20, ge=1, le=100),
+                               api_key: Optional[str] = Header(None, alias="X-API-Key")):
+    """
+    The caller's most recent stored analyses (metadata only), newest first.
+    Callers without an API key all share the "anonymous" tenant, so they get no history.
+    """
+    tenant = accounting.tenant_for(api_key)
+    if tenant == "anonymous":
+        raise HTTPException(status_code=404, detail="No stored analyses without an API key")
+    return {"analyses": await store.list_analyses(tenant, profile_hash, persona, limit)}
+
+@app.websocket("/ws/analyze")
+async def analyze_websocket(websocket: WebSocket, api_key: Optional[str] = Header(None, alias="X-API-Key"),
+                            api_key_param: Optional[str] = Query(None, alias="api_key")):
+    """
+    Optional WebSocket transport: consecutive analyses on one socket, section streams
+    multiplexed as channels, and per-section cancel/re-run plus pause (see ws_session.py).
+    Browsers cannot set headers on a WebSocket, so the API key may also be passed as ?api_key=.
+    """
+    if not config.WEBSOCKET_ENABLED:
+        await websocket.close(code=1008, reason="WebSocket transport disabled")
+        return
+    await ws_session.Session(websocket, api_key or api_key_param).run()
+
+@app.get("/metrics")
+async def metrics():
+    """In-process performance counters."""
+    return {
+        "accounting": accounting.metrics(),
+        "admission": admission.metrics(),
+        "cassette": cassette.metrics(),
+        "fused_sections": analysis.fusion_stats,
+        "routing": router.metrics(),
+        "semantic_cache": semantic_cache.cache.metrics(),
+        "single_flight": singleflight.metrics(),
+        "store": store.metrics(),
+        "websocket": ws_session.metrics(),
+    }
+
 @app.get("/health")
 async def health_check():
     """A simple health check endpoint to confirm the API is running."""
@@ -104,4 +322,4 @@ async def health_check():
 if __name__ == "__main__":
     import uvicorn
     # This allows you to run the app directly using `python main.py`
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True)
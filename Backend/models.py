@@ -2,7 +2,7 @@
 This file defines the Pydantic models for your application.
 These models are used for request and response data validation.
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict
 
 class Experience(BaseModel):
@@ -40,6 +40,7 @@ class LinkedInProfile(BaseModel):
     target_personas: Optional[List[str]] = ["general"]
     is_job_seeking: Optional[bool] = False
     target_job_descriptions: Optional[List[str]] = []
+    output_format: Optional[str] = "text"  # "text" or "structured"
 
 # Pydantic Models for API responses
 class PersonaAnalysisResponse(BaseModel):
@@ -55,3 +56,37 @@ class PersonaAnalysisResponse(BaseModel):
 
 class AnalysisResponse(BaseModel):
     results: Dict[str, PersonaAnalysisResponse]
+    analysis_id: Optional[str] = None
+    pre_analysis: Optional[Dict] = None
+    usage: Optional[Dict] = None
+    trace: Optional[List[Dict]] = None
+
+class IncrementalAnalysisRequest(BaseModel):
+    previous_analysis_id: str
+    profile: LinkedInProfile
+
+# Structured output mode models
+class UserContext(BaseModel):
+    seniority: str = "Mid-level"
+    industry: str = "Technology"
+    career_goal: str = "Career growth"
+    target_audience: str = "general"
+    tone_preference: str = "Professional-formal"
+    key_strength: str = "Technical skills"
+    primary_gap: str = "Quantifiable achievements"
+
+class SectionFeedback(BaseModel):
+    """Compact per-section result. Serialized with short keys on the wire."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    score: Optional[int] = Field(default=None, ge=0, le=100, alias="s")
+    summary: str = Field(default="", alias="m")
+    issues: List[str] = Field(default_factory=list, alias="i")
+    rewrites: List[str] = Field(default_factory=list, alias="r")
+
+class StructuredAnalysisResponse(BaseModel):
+    results: Dict[str, Dict[str, SectionFeedback]]
+    analysis_id: Optional[str] = None
+    pre_analysis: Optional[Dict] = None
+    usage: Optional[Dict] = None
+    trace: Optional[List[Dict]] = None
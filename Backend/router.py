@@ -0,0 +1,283 @@
+"""
+This file routes each LLM call to a provider.
+The choice per section uses live latency and error statistics, the input
+size, the section's criticality and the configured cost ceilings. Failing
+providers are taken out of rotation by a circuit breaker, a section that
+had to fall back sticks to its fallback for a while, and every decision is
+added to the request's trace.
+"""
+import asyncio
+import time
+from collections import Counter, deque
+from typing import AsyncGenerator, Optional
+
+import accounting
+import config
+import services
+
+# provider -> (streaming function, non-streaming function) in services
+PROVIDER_FUNCTIONS = {
+    "cerebras": ("call_cerebras_stream", "call_cerebras_api"),
+    "openrouter": ("call_llama_stream", "call_llama_api"),
+}
+
+class ProviderHealth:
+    """Recent latency and outcomes of one provider, plus its circuit breaker"""
+    def __init__(self):
+        self.ttft_ms = deque(maxlen=config.ROUTING_WINDOW)
+        self.ms_per_ktok = deque(maxlen=config.ROUTING_WINDOW)
+        # Whole duration of non-streaming calls, kept apart from the streaming samples
+        self.call_ms = deque(maxlen=config.ROUTING_WINDOW)
+        self.outcomes = deque(maxlen=config.ROUTING_WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.calls = 0
+        self.failures = 0
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < config.CIRCUIT_COOLDOWN_SECONDS:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        """Closed, or half-open with no probe call already under way"""
+        state = self.state()
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def success(self, ttft_ms: Optional[float], ms_per_ktok: Optional[float], call_ms: Optional[float] = None):
+        self.calls += 1
+        self.outcomes.append(True)
+        if ttft_ms is not None:
+            self.ttft_ms.append(ttft_ms)
+        if ms_per_ktok is not None:
+            self.ms_per_ktok.append(ms_per_ktok)
+        if call_ms is not None:
+            self.call_ms.append(call_ms)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.calls += 1
+        self.failures += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        # A failed probe re-opens the breaker for another cooldown
+        if self.probing or self.consecutive_failures >= config.CIRCUIT_FAILURE_THRESHOLD:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+_health = {provider: ProviderHealth() for provider in PROVIDER_FUNCTIONS}
+_sticky = {}
+decisions = Counter()
+
+def percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+# ==================== ROUTING ====================
+def estimated_cost(provider: str, input_tokens: int, max_tokens: int) -> float:
+    """Worst-case cost of a call (every allowed output token generated)"""
+    pricing = config.MODEL_PRICING_PER_MTOK.get(services.provider_model(provider), (0.0, 0.0))
+    return (input_tokens * pricing[0] + max_tokens * pricing[1]) / 1_000_000
+
+def estimated_latency_ms(provider: str, max_tokens: int, streaming: bool = True) -> Optional[float]:
+    """
+    p95 time to first token plus p95 generation time for the expected output; None until enough samples.
+    Non-streaming calls use the p95 duration of past non-streaming calls once there are enough of them.
+    """
+    health = _health[provider]
+    if not streaming and len(health.call_ms) >= config.ROUTING_MIN_SAMPLES:
+        return percentile(health.call_ms, 0.95)
+    if len(health.ttft_ms) < config.ROUTING_MIN_SAMPLES:
+        return None
+    generation = percentile(health.ms_per_ktok, 0.95) or 0.0
+    expected_tokens = max_tokens * config.ROUTING_EXPECTED_OUTPUT_SHARE
+    return percentile(health.ttft_ms, 0.95) + generation * expected_tokens / 1000
+
+def route(section: str, default: str, prompt: str, system_prompt: str, max_tokens: int, streaming: bool = True) -> dict:
+    """Pick the provider for one call and return the decision (also added to the request trace)"""
+    input_tokens = accounting.estimate_tokens(system_prompt + prompt)
+    critical = section in config.CRITICAL_SECTIONS
+    ceiling = config.ROUTING_COST_CEILING_USD if critical else config.ROUTING_NONCRITICAL_COST_CEILING_USD
+
+    candidates, excluded, scores = [], {}, None
+    for provider in PROVIDER_FUNCTIONS:
+        if not _health[provider].available():
+            excluded[provider] = "circuit_open"
+        elif input_tokens + max_tokens > config.PROVIDER_CONTEXT_TOKENS.get(provider, 0):
+            excluded[provider] = "context_limit"
+        elif ceiling and estimated_cost(provider, input_tokens, max_tokens) > ceiling:
+            excluded[provider] = "cost_ceiling"
+        else:
+            candidates.append(provider)
+
+    sticky = _sticky.get(section)
+    if sticky and sticky[1] <= time.monotonic():
+        del _sticky[section]
+        sticky = None
+
+    if not config.ROUTING_ENABLED:
+        provider, reason = default, "static"
+    elif not candidates:
+        # Nothing qualifies: try the default anyway rather than fail without a call
+        provider, reason = default, "no_candidate"
+    elif sticky and sticky[0] in candidates:
+        provider, reason = sticky[0], "sticky_fallback"
+    elif len(candidates) == 1:
+        provider = candidates[0]
+        reason = "default" if provider == default else excluded.get(default, "only_candidate")
+    else:
+        provider, reason, scores = _best(candidates, default, input_tokens, max_tokens, critical, streaming)
+
+    if _health[provider].state() == "half_open":
+        _health[provider].probing = True
+        reason += "+probe"
+
+    latency = estimated_latency_ms(provider, max_tokens, streaming)
+    decision = {
+        "section": section, "provider": provider, "model": services.provider_model(provider), "reason": reason,
+        "input_tokens": input_tokens, "est_latency_ms": round(latency) if latency is not None else None,
+        "est_cost_usd": round(estimated_cost(provider, input_tokens, max_tokens), 6),
+    }
+    if excluded:
+        decision["excluded"] = excluded
+    if scores:
+        decision["scores"] = {name: round(score, 1) for name, score in scores.items()}
+    _trace(decision)
+    return decision
+
+def _best(candidates: list, default: str, input_tokens: int, max_tokens: int, critical: bool,
+          streaming: bool = True) -> tuple[str, str, dict]:
+    """
+    Lowest score wins: expected p95 latency (ms) inflated by the recent error rate, plus cost for
+    non-critical sections. The default provider is kept unless another is clearly better
+    (by ROUTING_SWITCH_MARGIN and at least ROUTING_MIN_GAIN_MS).
+    """
+    latencies = {provider: estimated_latency_ms(provider, max_tokens, streaming) for provider in candidates}
+    if default in candidates and None in latencies.values():
+        # Not enough samples to compare yet (every provider is the default for some sections)
+        return default, "warming_up", {}
+
+    scores = {}
+    for provider in candidates:
+        score = (latencies[provider] or 0.0) * (1 + config.ROUTING_ERROR_PENALTY * _health[provider].error_rate())
+        if not critical:
+            score += estimated_cost(provider, input_tokens, max_tokens) * 100 * config.ROUTING_MS_PER_CENT
+        scores[provider] = score
+
+    best = min(candidates, key=lambda provider: scores[provider])
+    if default in scores and (scores[best] >= scores[default] * (1 - config.ROUTING_SWITCH_MARGIN)
+                              or scores[default] - scores[best] < config.ROUTING_MIN_GAIN_MS):
+        return default, "default", scores
+    return best, "better_score", scores
+
+def _trace(decision: dict):
+    decisions[decision["reason"]] += 1
+    account = accounting.current_account.get()
+    if account is not None:
+        account.setdefault("routes", []).append(decision)
+
+def request_trace() -> list:
+    """Routing decisions of the request running in the current context"""
+    account = accounting.current_account.get()
+    return account.get("routes", []) if account else []
+
+def _fallback(section: str, failed: str, decision: dict) -> Optional[dict]:
+    """Switch a failed call to the other available provider and keep the section there for a while"""
+    alternatives = [provider for provider in PROVIDER_FUNCTIONS if provider != failed and _health[provider].available()]
+    if not config.ROUTING_ENABLED or not alternatives:
+        return None
+    provider = alternatives[0]
+    _sticky[section] = (provider, time.monotonic() + config.ROUTING_STICKY_SECONDS)
+    fallback = {**decision, "provider": provider, "model": services.provider_model(provider), "reason": "fallback", "fallback_from": failed}
+    _trace(fallback)
+    return fallback
+
+# ==================== CALLS ====================
+async def stream(section: str, default: str, prompt: str, system_prompt: str, max_tokens: int) -> AsyncGenerator[str, None]:
+    """Routed streaming call. A provider failing before its first chunk is retried once on the fallback."""
+    decision = route(section, default, prompt, system_prompt, max_tokens)
+    while True:
+        provider = decision["provider"]
+        health = _health[provider]
+        started = time.perf_counter()
+        first_chunk_at, completion_chars = None, 0
+        try:
+            async for chunk in getattr(services, PROVIDER_FUNCTIONS[provider][0])(prompt, system_prompt, max_tokens):
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                completion_chars += len(chunk)
+                yield chunk
+        except Exception:
+            health.failure()
+            if first_chunk_at is not None or decision["reason"] == "fallback":
+                raise
+            decision = _fallback(section, provider, decision)
+            if decision is None:
+                raise
+            continue
+        finally:
+            # A probe abandoned by its consumer must not keep the breaker locked
+            if decision and decision["reason"].endswith("+probe"):
+                health.probing = False
+
+        finished = time.perf_counter()
+        first_chunk_at = first_chunk_at or finished
+        tokens = completion_chars / 4
+        health.success(
+            (first_chunk_at - started) * 1000,
+            (finished - first_chunk_at) * 1000 / tokens * 1000 if tokens >= 50 else None
+        )
+        return
+
+async def call(section: str, default: str, prompt: str, system_prompt: str, max_tokens: int) -> str:
+    """Routed non-streaming call, retried once on the fallback provider if it fails"""
+    decision = route(section, default, prompt, system_prompt, max_tokens, streaming=False)
+    while True:
+        provider = decision["provider"]
+        started = time.perf_counter()
+        try:
+            result = await getattr(services, PROVIDER_FUNCTIONS[provider][1])(prompt, system_prompt, max_tokens)
+        except asyncio.CancelledError:
+            _health[provider].probing = False
+            raise
+        except Exception:
+            _health[provider].failure()
+            if decision["reason"] == "fallback":
+                raise
+            decision = _fallback(section, provider, decision)
+            if decision is None:
+                raise
+            continue
+        # Without a stream there is no time to first token, only the duration of the whole call
+        _health[provider].success(None, None, (time.perf_counter() - started) * 1000)
+        return result
+
+def metrics() -> dict:
+    now = time.monotonic()
+    return {
+        "providers": {
+            provider: {
+                "state": health.state(), "calls": health.calls, "failures": health.failures,
+                "error_rate": round(health.error_rate(), 4),
+                **{name: round(value, 1) if value is not None else None for name, value in (
+                    ("ttft_p50_ms", percentile(health.ttft_ms, 0.5)),
+                    ("ttft_p95_ms", percentile(health.ttft_ms, 0.95)),
+                    ("ms_per_ktok_p95", percentile(health.ms_per_ktok, 0.95)),
+                    ("call_p95_ms", percentile(health.call_ms, 0.95)),
+                )},
+            }
+            for provider, health in _health.items()
+        },
+        "sticky": {section: provider for section, (provider, until) in _sticky.items() if until > now},
+        "decisions": dict(decisions),
+    }
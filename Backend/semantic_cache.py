@@ -0,0 +1,98 @@
+"""
+This file implements the semantic (near-duplicate) cache tier.
+Section content is embedded with a hashed character n-gram vectorizer and
+kept in a bounded in-memory matrix; lookups are a brute-force cosine
+similarity search restricted to entries generated for the same section
+and user context. Least recently used entries are evicted when full.
+"""
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+
+import config
+
+VECTOR_DIM = 512
+NGRAM_SIZE = 3
+
+def vectorize(text: str) -> np.ndarray:
+    """L2-normalised signed hashing of word unigrams and character trigrams"""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    normalized = " ".join(text.lower().split())
+    features = normalized.split() + [normalized[i:i + NGRAM_SIZE] for i in range(len(normalized) - NGRAM_SIZE + 1)]
+    for feature in features:
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % VECTOR_DIM] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticCache:
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.vectors = np.zeros((capacity, VECTOR_DIM), dtype=np.float32)
+        # hash() of the namespace string; stable for the life of the process
+        self.namespaces = np.zeros(capacity, dtype=np.int64)
+        self.values = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.clock = 0
+        self.stats = {"lookups": 0, "hits": 0, "exact_hits": 0, "inserts": 0, "evictions": 0, "lookup_ms_total": 0.0, "lookup_ms_max": 0.0}
+
+    def _tick(self) -> int:
+        self.clock += 1
+        return self.clock
+
+    def lookup(self, namespace: str, text: str) -> Optional[str]:
+        """Cached value for the most similar entry in this namespace, if above the threshold"""
+        started = time.perf_counter()
+        self.stats["lookups"] += 1
+        result = None
+
+        if self.size:
+            similarities = self.vectors[:self.size] @ vectorize(text)
+            similarities[self.namespaces[:self.size] != hash(namespace)] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                self.last_used[best] = self._tick()
+                self.stats["hits"] += 1
+                if similarities[best] >= 0.9999:
+                    self.stats["exact_hits"] += 1
+                result = self.values[best]
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["lookup_ms_total"] += elapsed_ms
+        self.stats["lookup_ms_max"] = max(self.stats["lookup_ms_max"], elapsed_ms)
+        return result
+
+    def insert(self, namespace: str, text: str, value: str):
+        if self.size < self.capacity:
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_used))
+            self.stats["evictions"] += 1
+        self.vectors[slot] = vectorize(text)
+        self.namespaces[slot] = hash(namespace)
+        self.values[slot] = value
+        self.last_used[slot] = self._tick()
+        self.stats["inserts"] += 1
+
+    def metrics(self) -> dict:
+        lookups = self.stats["lookups"]
+        return {
+            "size": self.size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "lookups": lookups,
+            "hits": self.stats["hits"],
+            "near_duplicate_hits": self.stats["hits"] - self.stats["exact_hits"],
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "inserts": self.stats["inserts"],
+            "evictions": self.stats["evictions"],
+            "avg_lookup_ms": round(self.stats["lookup_ms_total"] / lookups, 4) if lookups else 0.0,
+            "max_lookup_ms": round(self.stats["lookup_ms_max"], 4),
+        }
+
+cache = SemanticCache(config.SEMANTIC_CACHE_SIZE, config.SEMANTIC_CACHE_THRESHOLD)
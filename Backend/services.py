@@ -7,6 +7,8 @@ import httpx
 import json
 from typing import AsyncGenerator
 from fastapi import HTTPException
+import accounting
+import cassette
 import config
 
 print("\n" + "="*60)
@@ -18,9 +20,22 @@ print(f"Cerebras URL: {config.CEREBRAS_API_URL}")
 print(f"OpenRouter URL: {config.OPENROUTER_API_URL}")
 print("="*60 + "\n")
 
+def provider_model(provider: str) -> str:
+    """Model served by a provider"""
+    return {"cerebras": config.CEREBRAS_MODEL, "openrouter": config.OPENROUTER_MODEL}[provider]
+
+def record_usage(provider: str, model: str, prompt: str, system_prompt: str, completion_chars: int, usage: dict = None):
+    """Report a call's token usage, estimating locally when the provider sent no usage block"""
+    if usage:
+        accounting.record(provider, model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), estimated=False)
+    else:
+        accounting.record(provider, model, accounting.estimate_tokens(system_prompt + prompt), completion_chars // 4, estimated=True)
+
 # ==================== STREAMING FUNCTIONS ====================
+@cassette.recorded_stream("cerebras")
 async def call_cerebras_stream(prompt: str, system_prompt: str, max_tokens: int = 1000) -> AsyncGenerator[str, None]:
     """Stream Cerebras AI responses chunk by chunk"""
+    usage, completion_chars, started = None, 0, False
     async with httpx.AsyncClient(timeout=120.0) as client:
         try:
             async with client.stream(
@@ -31,17 +46,19 @@ async def call_cerebras_stream(prompt: str, system_prompt: str, max_tokens: int
                     "Content-Type": "application/json"
                 },
                 json={
-                    "model": "llama-4-scout-17b-16e-instruct",
+                    "model": config.CEREBRAS_MODEL,
                     "messages": [
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": prompt}
                     ],
                     "temperature": 0.7,
                     "max_tokens": max_tokens,
-                    "stream": True
+                    "stream": True,
+                    "stream_options": {"include_usage": True}
                 }
             ) as response:
                 response.raise_for_status()
+                started = True
                 async for line in response.aiter_lines():
                     if line.startswith("data: "):
                         data = line[6:]
@@ -49,18 +66,26 @@ async def call_cerebras_stream(prompt: str, system_prompt: str, max_tokens: int
                             break
                         try:
                             chunk = json.loads(data)
+                            if chunk.get("usage"):
+                                usage = chunk["usage"]
                             if "choices" in chunk and len(chunk["choices"]) > 0:
                                 delta = chunk["choices"][0].get("delta", {})
                                 content = delta.get("content", "")
                                 if content:
+                                    completion_chars += len(content)
                                     yield content
                         except json.JSONDecodeError:
                             continue
         except Exception as e:
             raise Exception(f"Cerebras streaming error: {str(e)}")
+        finally:
+            if started:
+                record_usage("cerebras", config.CEREBRAS_MODEL, prompt, system_prompt, completion_chars, usage)
 
+@cassette.recorded_stream("openrouter")
 async def call_llama_stream(prompt: str, system_prompt: str, max_tokens: int = 1500) -> AsyncGenerator[str, None]:
     """Stream OpenRouter API responses chunk by chunk"""
+    usage, completion_chars, started = None, 0, False
     async with httpx.AsyncClient(timeout=120.0) as client:
         try:
             async with client.stream(
@@ -73,17 +98,19 @@ async def call_llama_stream(prompt: str, system_prompt: str, max_tokens: int = 1
                     "X-Title": "LinkedIn Profile Analyzer"
                 },
                 json={
-                    "model": "meta-llama/llama-3.3-8b-instruct:free", 
+                    "model": config.OPENROUTER_MODEL, 
                     "messages": [
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": prompt}
                     ],
                     "temperature": 0.7,
                     "max_tokens": max_tokens,
-                    "stream": True
+                    "stream": True,
+                    "stream_options": {"include_usage": True}
                 }
             ) as response:
                 response.raise_for_status()
+                started = True
                 async for line in response.aiter_lines():
                     if line.startswith("data: "):
                         data = line[6:]
@@ -91,17 +118,24 @@ async def call_llama_stream(prompt: str, system_prompt: str, max_tokens: int = 1
                             break
                         try:
                             chunk = json.loads(data)
+                            if chunk.get("usage"):
+                                usage = chunk["usage"]
                             if "choices" in chunk and len(chunk["choices"]) > 0:
                                 delta = chunk["choices"][0].get("delta", {})
                                 content = delta.get("content", "")
                                 if content:
+                                    completion_chars += len(content)
                                     yield content
                         except json.JSONDecodeError:
                             continue
         except Exception as e:
             raise Exception(f"OpenRouter streaming error: {str(e)}")
+        finally:
+            if started:
+                record_usage("openrouter", config.OPENROUTER_MODEL, prompt, system_prompt, completion_chars, usage)
 
 # ==================== NON-STREAMING FUNCTIONS ====================
+@cassette.recorded_call("cerebras")
 async def call_cerebras_api(prompt: str, system_prompt: str, max_tokens: int = 1000) -> str:
     """Non-streaming Cerebras call"""
     async with httpx.AsyncClient(timeout=60.0) as client:
@@ -113,7 +147,7 @@ async def call_cerebras_api(prompt: str, system_prompt: str, max_tokens: int = 1
                     "Content-Type": "application/json"
                 },
                 json={
-                    "model": "llama-4-scout-17b-16e-instruct",
+                    "model": config.CEREBRAS_MODEL,
                     "messages": [
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": prompt}
@@ -123,10 +157,14 @@ async def call_cerebras_api(prompt: str, system_prompt: str, max_tokens: int = 1
                 }
             )
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+            record_usage("cerebras", config.CEREBRAS_MODEL, prompt, system_prompt, len(content), data.get("usage"))
+            return content
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Cerebras API error: {str(e)}")
 
+@cassette.recorded_call("openrouter")
 async def call_llama_api(prompt: str, system_prompt: str, max_tokens: int = 1500) -> str:
     """Non-streaming OpenRouter call"""
     async with httpx.AsyncClient(timeout=60.0) as client:
@@ -140,7 +178,7 @@ async def call_llama_api(prompt: str, system_prompt: str, max_tokens: int = 1500
                     "X-Title": "LinkedIn Profile Analyzer"
                 },
                 json={
-                    "model": "meta-llama/llama-3.3-8b-instruct:free",  
+                    "model": config.OPENROUTER_MODEL,  
                     "messages": [
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": prompt}
@@ -150,6 +188,9 @@ async def call_llama_api(prompt: str, system_prompt: str, max_tokens: int = 1500
                 }
             )
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+            record_usage("openrouter", config.OPENROUTER_MODEL, prompt, system_prompt, len(content), data.get("usage"))
+            return content
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"OpenRouter API error: {str(e)}")
\ No newline at end of file
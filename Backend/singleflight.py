@@ -0,0 +1,106 @@
+"""
+This file implements request coalescing (single-flight).
+Identical analyses that are in flight at the same time share one upstream
+computation: streams fan the same SSE frames out to every subscriber, and
+plain calls share one result.
+"""
+import asyncio
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Optional
+
+class _Flight:
+    def __init__(self):
+        self.frames = []
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.on_done = []
+
+    def finish(self):
+        """Run the completion callbacks once"""
+        callbacks, self.on_done = self.on_done, []
+        for callback in callbacks:
+            callback()
+
+_streams: Dict[str, _Flight] = {}
+_calls: Dict[str, asyncio.Task] = {}
+stats = {"streams_started": 0, "streams_coalesced": 0, "calls_started": 0, "calls_coalesced": 0}
+
+async def _produce(key: str, flight: _Flight, generator: AsyncGenerator[str, None]):
+    """Drive the upstream generator once, buffering every frame for the subscribers"""
+    try:
+        async for frame in generator:
+            flight.frames.append(frame)
+            flight.changed.set()
+            flight.changed = asyncio.Event()
+    finally:
+        flight.done = True
+        flight.changed.set()
+        if _streams.get(key) is flight:
+            del _streams[key]
+        flight.finish()
+
+def in_flight(key: str) -> bool:
+    return key in _streams
+
+def call_in_flight(key: str) -> bool:
+    return key in _calls
+
+async def stream(key: str, factory: Optional[Callable[[], AsyncGenerator[str, None]]],
+                 on_done: Optional[Callable[[], None]] = None) -> AsyncGenerator[str, None]:
+    """
+    Subscribe to the stream for this key, starting it with factory() if nobody else has.
+    Late subscribers first replay the frames already sent. With factory=None this only
+    attaches to an existing flight and yields nothing if there is none.
+    The upstream computation is cancelled once its last subscriber disconnects.
+    on_done runs when the shared upstream computation ends, not when this subscriber leaves.
+    """
+    flight = _streams.get(key)
+    if flight is None:
+        if factory is None:
+            if on_done:
+                on_done()
+            return
+        flight = _Flight()
+        _streams[key] = flight
+        flight.task = asyncio.create_task(_produce(key, flight, factory()))
+        stats["streams_started"] += 1
+    else:
+        stats["streams_coalesced"] += 1
+
+    if on_done:
+        flight.on_done.append(on_done)
+    flight.subscribers += 1
+    index = 0
+    try:
+        while True:
+            if index < len(flight.frames):
+                yield flight.frames[index]
+                index += 1
+                continue
+            if flight.done:
+                return
+            await flight.changed.wait()
+    finally:
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            flight.task.cancel()
+            if _streams.get(key) is flight:
+                del _streams[key]
+            flight.finish()
+
+async def call(key: str, factory: Callable[[], Awaitable]):
+    """Await the shared result for this key, starting factory() if it is not already running"""
+    task = _calls.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _calls[key] = task
+        task.add_done_callback(lambda _: _calls.pop(key, None))
+        stats["calls_started"] += 1
+    else:
+        stats["calls_coalesced"] += 1
+    # shield so one caller disconnecting does not cancel the others
+    return await asyncio.shield(task)
+
+def metrics() -> dict:
+    return {**stats, "streams_in_flight": len(_streams), "calls_in_flight": len(_calls)}
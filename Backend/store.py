@@ -0,0 +1,211 @@
+"""
+This file keeps completed analyses in a local SQLite database so they can be
+served again without any LLM call (GET /analyses/{id}), reused by the
+incremental re-analysis endpoint, and queried for analytics. Large payloads
+are stored zlib-compressed; old rows are compacted away by age and count.
+Recent analyses are also kept in memory so lookups right after a save never
+touch the disk.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import closing
+from typing import List, Optional
+
+import config
+
+_recent: "OrderedDict[str, dict]" = OrderedDict()
+_saves_since_compaction = 0
+# Database the schema was last created in (set up once per path, not on every connection)
+_schema_path: Optional[str] = None
+stats = {"saved": 0, "cache_hits": 0, "db_reads": 0, "misses": 0, "compactions": 0, "deleted": 0, "write_errors": 0}
+
+# ==================== ENCODING ====================
+def _pack(value) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 6)
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+# ==================== DATABASE ====================
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(config.ANALYSIS_DB_PATH, timeout=10)
+    conn.execute("PRAGMA foreign_keys = ON")
+    if _schema_path != config.ANALYSIS_DB_PATH:
+        _create_schema(conn)
+    return conn
+
+def _create_schema(conn: sqlite3.Connection):
+    global _schema_path
+    # Only takes effect on a new database; lets compaction give space back to the OS
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # Stored in the database file, so setting it once is enough
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("""CREATE TABLE IF NOT EXISTS analyses (
+        id TEXT PRIMARY KEY, tenant TEXT, profile_hash TEXT, template_version TEXT, output_format TEXT,
+        created_at REAL, size INTEGER, state BLOB, response BLOB)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS analysis_personas (
+        analysis_id TEXT REFERENCES analyses (id) ON DELETE CASCADE, persona TEXT,
+        profile_hash TEXT, template_version TEXT, created_at REAL,
+        PRIMARY KEY (analysis_id, persona))""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_tenant ON analyses (tenant, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_profile ON analyses (profile_hash, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses (created_at)")
+    # Serves the persona filter of list_analyses
+    conn.execute("DROP INDEX IF EXISTS idx_personas_lookup")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_personas_persona ON analysis_personas (persona, analysis_id)")
+    _schema_path = config.ANALYSIS_DB_PATH
+
+def _write(entry: dict):
+    try:
+        state, response = _pack(entry["state"]), _pack(entry["response"])
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry["id"], entry["tenant"], entry["profile_hash"], entry["template_version"], entry["output_format"],
+                 entry["created_at"], len(state) + len(response), state, response)
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO analysis_personas VALUES (?, ?, ?, ?, ?)",
+                [(entry["id"], persona, entry["profile_hash"], entry["template_version"], entry["created_at"])
+                 for persona in entry["state"].get("personas", {})]
+            )
+    except sqlite3.Error as e:
+        stats["write_errors"] += 1
+        print(f"⚠️ Failed to store analysis {entry['id']}: {e}")
+
+def compact():
+    """Delete analyses past the retention period or beyond MAX_STORED_ANALYSES (oldest first)"""
+    try:
+        with closing(_connect()) as conn:
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM analyses WHERE created_at < ?", (time.time() - config.ANALYSIS_RETENTION_DAYS * 86400,)
+                ).rowcount
+                deleted += conn.execute(
+                    "DELETE FROM analyses WHERE id IN (SELECT id FROM analyses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (config.MAX_STORED_ANALYSES,)
+                ).rowcount
+            if deleted:
+                conn.execute("PRAGMA incremental_vacuum")
+        stats["compactions"] += 1
+        stats["deleted"] += deleted
+    except sqlite3.Error as e:
+        print(f"⚠️ Failed to compact the analysis store: {e}")
+
+def _persist(entry: dict):
+    """Write one analysis, compacting every ANALYSIS_COMPACT_EVERY saves"""
+    global _saves_since_compaction
+    _write(entry)
+    _saves_since_compaction += 1
+    if _saves_since_compaction >= config.ANALYSIS_COMPACT_EVERY:
+        _saves_since_compaction = 0
+        compact()
+
+# ==================== API ====================
+def save_analysis(record: dict, response: Optional[dict] = None, profile_hash: str = "", tenant: str = "anonymous",
+                  output_format: str = "text") -> str:
+    """
+    Store an analysis and return its new id. record holds what incremental re-analysis
+    needs ('personas', 'template_version'); response is what GET /analyses/{id} serves back.
+    The database write runs in a worker thread.
+    """
+    entry = {
+        "id": uuid.uuid4().hex, "tenant": tenant, "profile_hash": profile_hash,
+        "template_version": record.get("template_version", ""), "output_format": output_format,
+        "created_at": time.time(), "state": record, "response": response or {},
+    }
+    _remember(entry)
+    stats["saved"] += 1
+    try:
+        asyncio.get_running_loop().run_in_executor(None, _persist, entry)
+    except RuntimeError:
+        _persist(entry)
+    return entry["id"]
+
+def _remember(entry: dict):
+    _recent[entry["id"]] = entry
+    _recent.move_to_end(entry["id"])
+    while len(_recent) > config.ANALYSIS_CACHE_SIZE:
+        _recent.popitem(last=False)
+
+def _read(analysis_id: str) -> Optional[dict]:
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT id, tenant, profile_hash, template_version, output_format, created_at, state, response FROM analyses WHERE id = ?",
+            (analysis_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    entry = dict(zip(("id", "tenant", "profile_hash", "template_version", "output_format", "created_at"), row[:6]))
+    entry["state"], entry["response"] = _unpack(row[6]), _unpack(row[7])
+    return entry
+
+async def _load(analysis_id: str) -> Optional[dict]:
+    """Recent analyses come from memory; anything else is read from the database in a worker thread"""
+    entry = _recent.get(analysis_id)
+    if entry is not None:
+        stats["cache_hits"] += 1
+        _recent.move_to_end(analysis_id)
+        return entry
+    entry = await asyncio.get_running_loop().run_in_executor(None, _read, analysis_id)
+    if entry is None:
+        stats["misses"] += 1
+        return None
+    stats["db_reads"] += 1
+    _remember(entry)
+    return entry
+
+async def get_analysis(analysis_id: str, tenant: Optional[str] = None) -> Optional[dict]:
+    """
+    Look up the stored record used by incremental re-analysis, or None if unknown or
+    compacted away. When tenant is given, another tenant's analysis counts as unknown.
+    """
+    entry = await _load(analysis_id)
+    if entry is None or (tenant is not None and entry["tenant"] != tenant):
+        return None
+    return entry["state"]
+
+async def get_stored_response(analysis_id: str) -> Optional[dict]:
+    """A stored analysis with its metadata and the response it was served with"""
+    entry = await _load(analysis_id)
+    if entry is None:
+        return None
+    return {key: value for key, value in entry.items() if key != "state"}
+
+async def list_analyses(tenant: str, profile_hash: Optional[str] = None, persona: Optional[str] = None, limit: int = 20) -> List[dict]:
+    """Most recent analyses of a tenant, optionally for one profile hash and/or persona (queried in a worker thread)"""
+    return await asyncio.get_running_loop().run_in_executor(None, _list, tenant, profile_hash, persona, limit)
+
+def _list(tenant: str, profile_hash: Optional[str], persona: Optional[str], limit: int) -> List[dict]:
+    query = "SELECT id, profile_hash, template_version, output_format, created_at, size FROM analyses WHERE tenant = ?"
+    params = [tenant]
+    if profile_hash:
+        query += " AND profile_hash = ?"
+        params.append(profile_hash)
+    if persona:
+        query += " AND id IN (SELECT analysis_id FROM analysis_personas WHERE persona = ?)"
+        params.append(persona)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    with closing(_connect()) as conn:
+        rows = conn.execute(query, params).fetchall()
+        personas = {}
+        if rows:
+            ids = [row[0] for row in rows]
+            for analysis_id, name in conn.execute(
+                f"SELECT analysis_id, persona FROM analysis_personas WHERE analysis_id IN ({','.join('?' * len(ids))})", ids
+            ):
+                personas.setdefault(analysis_id, []).append(name)
+    return [
+        {"analysis_id": row[0], "profile_hash": row[1], "template_version": row[2], "output_format": row[3],
+         "created_at": row[4], "size_bytes": row[5], "personas": personas.get(row[0], [])}
+        for row in rows
+    ]
+
+def metrics() -> dict:
+    return {**stats, "cached": len(_recent)}
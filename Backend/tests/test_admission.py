@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import admission
+import config
+from models import LinkedInProfile
+
+PROFILE = LinkedInProfile(headline='Engineer', about='', experiences=[], education=[], skills=[], projects=[], certifications=[])
+FULL = admission.estimate_tokens(PROFILE)
+DEGRADED = admission.estimate_tokens(PROFILE, frozenset(config.DEGRADED_SECTIONS))
+
+@pytest.fixture(autouse=True)
+def empty_admission(monkeypatch):
+    monkeypatch.setattr(admission, "_active", set())
+    monkeypatch.setattr(admission, "_waiters", admission.deque())
+    monkeypatch.setattr(config, "PROVIDER_TOKEN_CAPACITY", FULL * 10)
+    monkeypatch.setattr(config, "TENANT_MAX_CAPACITY_SHARE", 0.5)
+    monkeypatch.setattr(config, "PRIORITY_API_KEYS", {"vip"})
+    monkeypatch.setattr(config, "ADMISSION_QUEUE_TIMEOUT", 0.2)
+
+def admit(tenant: str, api_key=None):
+    return asyncio.run(admission.admit(PROFILE, api_key, tenant=tenant))
+
+def test_tenant_over_its_share_is_rejected_at_once_not_queued():
+    for _ in range(5):
+        admit("acme")
+    queued = admission.stats["queued"]
+    with pytest.raises(HTTPException) as error:
+        admit("acme", api_key="vip")
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+    assert admission.stats["queued"] == queued
+    # Other tenants are unaffected at 50% load
+    assert admit("beta").degraded_sections == frozenset()
+
+def test_tenant_near_its_share_gets_a_degraded_analysis(monkeypatch):
+    monkeypatch.setattr(config, "PROVIDER_TOKEN_CAPACITY", FULL * 4 + DEGRADED * 2)
+    admit("acme")
+    admit("acme")
+    assert admit("acme").degraded_sections == frozenset(config.DEGRADED_SECTIONS)
+
+def test_anonymous_callers_are_exempt_from_the_tenant_share():
+    tickets = [admit("anonymous") for _ in range(6)]
+    assert len(tickets) == 6
+
+def test_capacity_exceeded_is_still_a_503():
+    for tenant in ("a", "b", "c", "d", "e", "f", "g", "h", "i", "j"):
+        admit(tenant)
+    with pytest.raises(HTTPException) as error:
+        admit("k")
+    assert error.value.status_code == 503
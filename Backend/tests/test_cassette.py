@@ -0,0 +1,56 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import cassette
+import config
+
+@pytest.fixture
+def cassette_file(tmp_path, monkeypatch):
+    path = tmp_path / "llm.jsonl.gz"
+    monkeypatch.setattr(config, "LLM_CASSETTE_PATH", str(path))
+    monkeypatch.setattr(config, "LLM_REPLAY_SPEED", 0)
+    monkeypatch.setattr(cassette, "_recorded", [])
+    monkeypatch.setattr(cassette, "_replay", None)
+    return path
+
+def recorded(outcome):
+    @cassette.recorded_call("cerebras")
+    async def call(prompt: str, system_prompt: str, max_tokens: int = 100) -> str:
+        await asyncio.sleep(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+    return call
+
+def test_cancelled_call_is_not_recorded(cassette_file, monkeypatch):
+    monkeypatch.setattr(config, "LLM_CASSETTE_MODE", "record")
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(recorded(asyncio.CancelledError())("prompt", "system"))
+    assert cassette._recorded == []
+
+def test_results_and_errors_replay(cassette_file, monkeypatch):
+    monkeypatch.setattr(config, "LLM_CASSETTE_MODE", "record")
+    assert asyncio.run(recorded("fine")("ok", "system")) == "fine"
+    with pytest.raises(HTTPException):
+        asyncio.run(recorded(HTTPException(status_code=500, detail="upstream down"))("bad", "system"))
+    cassette.save()
+
+    monkeypatch.setattr(config, "LLM_CASSETTE_MODE", "replay")
+    replay = recorded("live call")
+    assert asyncio.run(replay("ok", "system")) == "fine"
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(replay("bad", "system"))
+    assert error.value.detail == "upstream down"
+
+def test_incomplete_entries_are_skipped_on_load(cassette_file, monkeypatch):
+    key = cassette.request_key("cerebras", "prompt", "system", 100)
+    with gzip.open(cassette_file, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"k": key, "p": "cerebras", "t": 1.0}) + "\n")
+        f.write(json.dumps({"k": key, "p": "cerebras", "r": "recorded", "t": 1.0}) + "\n")
+    monkeypatch.setattr(config, "LLM_CASSETTE_MODE", "replay")
+    replay = recorded("live call")
+    assert [asyncio.run(replay("prompt", "system")) for _ in range(3)] == ["recorded"] * 3
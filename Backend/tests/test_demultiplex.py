@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from utils import DelimiterProtocolError, demultiplex_sections
+
+SECTIONS = ["education", "skills"]
+
+async def stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+def split(chunks, sections=SECTIONS, **kwargs):
+    """Run the demultiplexer; returns {section: text} and the error raised, if any"""
+    async def run():
+        texts, error = {}, None
+        try:
+            async for text, section in demultiplex_sections(stream(chunks), sections, **kwargs):
+                texts[section] = texts.get(section, "") + text
+        except DelimiterProtocolError as e:
+            error = e
+        return texts, error
+    return asyncio.run(run())
+
+def test_markers_split_across_chunks():
+    response = "<<<SECTION:education>>>\nGood degree.<<<END:education>>>\n<<<SECTION:skills>>>\nAdd Go.<<<END:skills>>>"
+    for size in (1, 3, 7, 16):
+        texts, error = split([response[i:i + size] for i in range(0, len(response), size)])
+        assert error is None
+        assert texts == {"education": "Good degree.", "skills": "Add Go."}
+
+def test_angle_brackets_in_text_are_not_lost():
+    texts, error = split(["<<<SECTION:education>>>Use <b>bold</b> < 3 times", "<<<END:education>>><<<SECTION:skills>>>ok"])
+    assert error is None
+    assert texts["education"] == "Use <b>bold</b> < 3 times"
+
+def test_missing_end_before_next_section_and_at_the_end():
+    texts, error = split(["<<<SECTION:education>>>Degree", "<<<SECTION:skills>>>Skills"])
+    assert error is None
+    assert texts == {"education": "Degree", "skills": "Skills"}
+
+def test_truncated_response_reports_completed_sections():
+    texts, error = split(["<<<SECTION:education>>>Degree<<<END:education>>><<<SECTION:skills>>>Ski"], ["education", "skills", "projects"])
+    assert "missing section(s): skills, projects" in str(error)
+    assert error.completed == ["education"]
+
+def test_stray_text_over_the_limit():
+    texts, error = split(["Sure! Here is the analysis. " * 3, "<<<SECTION:education>>>Degree"], max_stray_chars=50)
+    assert "outside the section delimiters" in str(error)
+    assert texts == {}
+    texts, error = split(["Sure!\n<<<SECTION:education>>>A<<<END:education>>>", "<<<SECTION:skills>>>B"], max_stray_chars=50)
+    assert error is None
+
+def test_repeated_section():
+    texts, error = split(["<<<SECTION:education>>>A<<<END:education>>><<<SECTION:education>>>again"])
+    assert "unexpected section marker 'education'" in str(error)
+    assert error.completed == ["education"]
+
+def test_unknown_section_and_mismatched_end():
+    _, error = split(["<<<SECTION:hobbies>>>x"])
+    assert "unexpected section marker 'hobbies'" in str(error)
+    _, error = split(["<<<SECTION:education>>>x<<<END:skills>>>"])
+    assert "end marker 'skills' outside its section" in str(error)
+
+def test_upstream_is_closed_on_error():
+    closed = []
+    async def upstream():
+        try:
+            yield "<<<SECTION:hobbies>>>"
+            yield "never read"
+        finally:
+            closed.append(True)
+    async def run():
+        with pytest.raises(DelimiterProtocolError):
+            async for _ in demultiplex_sections(upstream(), SECTIONS):
+                pass
+    asyncio.run(run())
+    assert closed == [True]
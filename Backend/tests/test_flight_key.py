@@ -0,0 +1,12 @@
+import analysis
+from models import LinkedInProfile
+
+PROFILE = LinkedInProfile(headline='Engineer', about='I build things', experiences=[], education=[], skills=['Python'],
+                          projects=[], certifications=[])
+
+def test_identical_requests_of_one_tenant_share_a_key():
+    assert analysis.flight_key(PROFILE, 'acme') == analysis.flight_key(PROFILE.model_copy(), 'acme')
+
+def test_tenants_never_share_a_key():
+    assert analysis.flight_key(PROFILE, 'acme') != analysis.flight_key(PROFILE, 'beta')
+    assert analysis.flight_key(PROFILE, 'acme', 'a1') != analysis.flight_key(PROFILE, 'acme')
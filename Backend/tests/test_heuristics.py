@@ -0,0 +1,19 @@
+from datetime import date
+
+import heuristics
+from models import Experience
+
+def experience(description: str) -> Experience:
+    return Experience(jobTitle="Engineer", company="Acme", description=description, startDate="2020-01", endDate="2022-01")
+
+def test_description_lines_drop_bullet_only_lines():
+    assert heuristics.description_lines("- Led the team\n\t-\n- \xa0\n•\n* Built X") == ["Led the team", "Built X"]
+
+def test_check_experience_with_bullet_only_lines():
+    result = heuristics.check_experience([experience("\t-\n- \xa0\n- Led a team of 5")], today=date(2024, 1, 1))
+    assert result["bullets"] == 1
+    assert result["action_verb_bullets"] == 1
+
+def test_check_experience_counts_action_bullets_and_weak_phrases():
+    result = heuristics.check_experience([experience("- Led a team\n- Responsible for things")], today=date(2024, 1, 1))
+    assert (result["bullets"], result["action_verb_bullets"], result["weak_phrases"]) == (2, 1, 1)
@@ -0,0 +1,32 @@
+import analysis
+from models import LinkedInProfile
+
+CONTEXT = {
+    'seniority': 'Senior', 'industry': 'Technology', 'career_goal': 'Career growth', 'target_audience': 'general',
+    'tone_preference': 'Technical', 'key_strength': 'Distributed systems', 'primary_gap': 'No metrics',
+    'persona': 'general', 'output_format': 'text',
+}
+
+def profile(**fields) -> LinkedInProfile:
+    return LinkedInProfile(**{'headline': 'Engineer', 'about': 'I build things', 'experiences': [], 'education': [], 'skills': ['Python'],
+                              'projects': [], 'certifications': [], **fields})
+
+def stored_persona(profile: LinkedInProfile) -> dict:
+    sections = {name: f'{name} feedback' for name in ['headline', 'about', 'experience', 'education', 'skills', 'projects', 'certifications', 'holistic']}
+    return analysis.persona_record(profile, CONTEXT, sections)
+
+def test_regenerated_free_text_keeps_the_stored_context():
+    regenerated = {**CONTEXT, 'key_strength': 'Scaling backends', 'primary_gap': 'Weak headline', 'seniority': ' senior'}
+    assert analysis.incremental_context(stored_persona(profile()), regenerated) is CONTEXT
+
+def test_changed_key_field_uses_the_new_context():
+    regenerated = {**CONTEXT, 'industry': 'Finance'}
+    assert analysis.incremental_context(stored_persona(profile()), regenerated) is regenerated
+    assert analysis.incremental_context(None, regenerated) is regenerated
+
+def test_about_edit_reuses_everything_but_about_and_holistic():
+    previous = stored_persona(profile())
+    edited = profile(about='I build reliable things')
+    context = analysis.incremental_context(previous, {**CONTEXT, 'key_strength': 'Reliability'})
+    reused = analysis.reusable_sections(previous, analysis.section_fingerprints(edited), context)
+    assert reused == {'headline', 'experience', 'education', 'skills', 'projects', 'certifications'}
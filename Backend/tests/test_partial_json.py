@@ -0,0 +1,26 @@
+from utils import parse_partial_json
+
+def test_nothing_before_the_object_starts():
+    assert parse_partial_json("") is None
+    assert parse_partial_json("Here is the JSON:") is None
+
+def test_fenced_preamble_is_skipped():
+    assert parse_partial_json('```json\n{"score": 80, "summary": "Good"}\n```') == {"score": 80, "summary": "Good"}
+
+def test_trailing_text_after_the_object_is_ignored():
+    assert parse_partial_json('{"score": 80} Let me know if you need more.') == {"score": 80}
+
+def test_open_string_and_array_are_closed():
+    assert parse_partial_json('{"summary": "Strong lead", "issues": ["No met') == {"summary": "Strong lead", "issues": ["No met"]}
+
+def test_escape_at_the_end_of_the_buffer():
+    assert parse_partial_json('{"summary": "Says \\') == {"summary": "Says "}
+    assert parse_partial_json('{"summary": "Says \\"hi\\"", "issues": ["a\\') == {"summary": 'Says "hi"', "issues": ["a"]}
+
+def test_braces_inside_strings_do_not_close_the_object():
+    assert parse_partial_json('{"summary": "use {x} and [y]", "score": 5') == {"summary": "use {x} and [y]", "score": 5}
+
+def test_falls_back_to_the_last_complete_member():
+    assert parse_partial_json('{"score": 80, "summary": "Good", "issues": [') == {"score": 80, "summary": "Good", "issues": []}
+    assert parse_partial_json('{"score": 80, "summ') == {"score": 80}
+    assert parse_partial_json('{"score": 80, "summary":') == {"score": 80}
@@ -0,0 +1,73 @@
+import pytest
+
+import config
+import router
+
+@pytest.fixture(autouse=True)
+def fresh_router(monkeypatch):
+    monkeypatch.setattr(router, "_health", {provider: router.ProviderHealth() for provider in router.PROVIDER_FUNCTIONS})
+    monkeypatch.setattr(router, "_sticky", {})
+    monkeypatch.setattr(config, "ROUTING_ENABLED", True)
+    monkeypatch.setattr(config, "ROUTING_COST_CEILING_USD", 0)
+    monkeypatch.setattr(config, "ROUTING_NONCRITICAL_COST_CEILING_USD", 0)
+
+def warm_up(provider: str, ttft_ms: float, count: int = config.ROUTING_MIN_SAMPLES):
+    for _ in range(count):
+        router._health[provider].success(ttft_ms, 20.0)
+
+def route(section: str, default: str = "cerebras") -> dict:
+    return router.route(section, default, "prompt " * 50, "system", 800)
+
+def test_default_until_every_provider_has_samples():
+    warm_up("openrouter", 10)
+    assert route("skills")["provider"] == "cerebras"
+    assert route("skills")["reason"] == "warming_up"
+
+def test_equal_latency_keeps_the_default_without_a_cost_weight(monkeypatch):
+    monkeypatch.setattr(config, "ROUTING_MS_PER_CENT", 0)
+    warm_up("cerebras", 300)
+    warm_up("openrouter", 300)
+    for section in ("skills", "education", "fused", "headline_options"):
+        assert route(section)["provider"] == "cerebras", section
+
+def test_cost_weight_only_moves_non_critical_sections(monkeypatch):
+    monkeypatch.setattr(config, "ROUTING_MS_PER_CENT", 2000)
+    monkeypatch.setitem(config.MODEL_PRICING_PER_MTOK, config.CEREBRAS_MODEL, (100.0, 100.0))
+    monkeypatch.setitem(config.MODEL_PRICING_PER_MTOK, config.OPENROUTER_MODEL, (0.0, 0.0))
+    warm_up("cerebras", 300)
+    warm_up("openrouter", 300)
+    assert route("skills")["provider"] == "openrouter"
+    assert route("fused")["provider"] == "cerebras"
+    assert route("headline")["provider"] == "cerebras"
+
+def test_clearly_faster_provider_wins():
+    warm_up("cerebras", 3000)
+    warm_up("openrouter", 300)
+    decision = route("about")
+    assert (decision["provider"], decision["reason"]) == ("openrouter", "better_score")
+
+def test_circuit_breaker_opens_and_probes(monkeypatch):
+    for _ in range(config.CIRCUIT_FAILURE_THRESHOLD):
+        router._health["cerebras"].failure()
+    decision = route("skills")
+    assert decision["provider"] == "openrouter"
+    assert decision["excluded"] == {"cerebras": "circuit_open"}
+
+    monkeypatch.setattr(config, "CIRCUIT_COOLDOWN_SECONDS", 0)
+    decision = route("skills")
+    assert (decision["provider"], decision["reason"]) == ("cerebras", "warming_up+probe")
+    # Only one probe at a time: the next call goes elsewhere until the probe reports back
+    assert route("skills")["provider"] == "openrouter"
+    router._health["cerebras"].success(200, 20.0)
+    assert router._health["cerebras"].state() == "closed"
+
+def test_non_streaming_calls_do_not_feed_time_to_first_token():
+    warm_up("cerebras", 300)
+    warm_up("openrouter", 300)
+    for _ in range(config.ROUTING_MIN_SAMPLES):
+        router._health["cerebras"].success(None, None, 8000)
+    assert list(router._health["cerebras"].ttft_ms) == [300] * config.ROUTING_MIN_SAMPLES
+    # Streaming calls still see a fast first token; whole-call estimates use the call durations
+    assert route("about")["provider"] == "cerebras"
+    decision = router.route("about", "cerebras", "prompt " * 50, "system", 800, streaming=False)
+    assert (decision["provider"], decision["reason"]) == ("openrouter", "better_score")
@@ -0,0 +1,30 @@
+import pytest
+
+import analysis
+import semantic_cache
+
+CONTEXT = {
+    'seniority': 'Entry-level', 'industry': 'Technology', 'career_goal': 'Job seeking', 'target_audience': 'recruiter',
+    'tone_preference': 'Professional-casual', 'key_strength': 'Full-stack web apps', 'primary_gap': 'No experience',
+    'persona': 'recruiter', 'output_format': 'text',
+}
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "cache", semantic_cache.SemanticCache(100, 0.92))
+
+def test_free_text_context_does_not_split_the_namespace():
+    other = {**CONTEXT, 'key_strength': 'React and Node', 'primary_gap': 'Lacks projects',
+             'career_goal': 'Career growth', 'tone_preference': 'Technical', 'seniority': 'entry-level '}
+    assert analysis.semantic_cache_namespace('skills', CONTEXT) == analysis.semantic_cache_namespace('skills', other)
+
+def test_key_context_fields_split_the_namespace():
+    for field, value in (('seniority', 'Senior'), ('industry', 'Finance'), ('target_audience', 'client'), ('output_format', 'structured')):
+        assert analysis.semantic_cache_namespace('skills', CONTEXT) != analysis.semantic_cache_namespace('skills', {**CONTEXT, field: value})
+    assert analysis.semantic_cache_namespace('skills', CONTEXT) != analysis.semantic_cache_namespace('certifications', CONTEXT)
+
+def test_cohort_profiles_with_different_free_text_context_share_an_entry():
+    skills = ['JavaScript', 'React', 'Node.js', 'HTML', 'CSS', 'Git', 'SQL']
+    analysis.cache_feedback('skills', skills, CONTEXT, 'Skills feedback')
+    other = {**CONTEXT, 'key_strength': 'Building React apps', 'primary_gap': 'Needs backend depth'}
+    assert analysis.cached_feedback('skills', list(reversed(skills)), other) == 'Skills feedback'
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from fastapi import HTTPException
+
+import admission
+import main
+import singleflight
+from models import LinkedInProfile
+
+PROFILE = LinkedInProfile(headline='Engineer', about='', experiences=[], education=[], skills=[], projects=[], certifications=[])
+
+async def frames(*items, delay: float = 0):
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+def collect(generator):
+    async def run():
+        return [frame async for frame in generator]
+    return asyncio.run(run())
+
+def test_coalesced_request_is_admitted_again_if_the_flight_ended(monkeypatch):
+    started_with, admitted = [], admission.Ticket(500, frozenset(), "acme")
+    async def admit(profile, api_key=None, coalesced=False, tenant="anonymous"):
+        return admitted
+    monkeypatch.setattr(admission, "admit", admit)
+    def start(ticket):
+        started_with.append(ticket)
+        return frames("own")
+
+    stream = main.analysis_stream("k1", admission.Ticket(0, frozenset(), "acme", coalesced=True), start, PROFILE, None, "acme")
+    assert collect(stream) == ["own"]
+    assert started_with == [admitted]
+
+def test_coalesced_request_attaches_without_starting(monkeypatch):
+    async def run():
+        original = singleflight.stream("k2", lambda: frames("a", "b", delay=0.01))
+        first = await original.__anext__()
+        started = []
+        joined = main.analysis_stream("k2", admission.Ticket(0, frozenset(), "acme", coalesced=True),
+                                      lambda ticket: started.append(ticket) or frames("own"), PROFILE, None, "acme")
+        received = [frame async for frame in joined]
+        rest = [frame async for frame in original]
+        return first, received, rest, started
+    first, received, rest, started = asyncio.run(run())
+    assert (first, received, rest, started) == ("a", ["a", "b"], ["b"], [])
+
+def test_failed_readmission_ends_with_a_fallback_error(monkeypatch):
+    async def admit(profile, api_key=None, coalesced=False, tenant="anonymous"):
+        raise HTTPException(status_code=503, detail="Analysis capacity exceeded, please retry shortly")
+    monkeypatch.setattr(admission, "admit", admit)
+    stream = main.analysis_stream("k3", admission.Ticket(0, frozenset(), "acme", coalesced=True),
+                                  lambda ticket: frames("own"), PROFILE, None, "acme")
+    [frame] = collect(stream)
+    assert json.loads(frame[len("data: "):]) == {"type": "error", "message": "Analysis capacity exceeded, please retry shortly", "trigger_fallback": True}
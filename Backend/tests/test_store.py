@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+import main
+import store
+
+@pytest.fixture
+def analysis_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "ANALYSIS_DB_PATH", str(tmp_path / "analyses.db"))
+    monkeypatch.setattr(config, "API_KEY_TENANTS", {"key-a": "acme", "key-b": "beta"})
+    monkeypatch.setattr(store, "_recent", store.OrderedDict())
+    record = {"personas": {"general": {"context": {}, "fingerprints": {}, "sections": {}}}, "template_version": "v1"}
+    return store.save_analysis(record, {"results": {}}, profile_hash="hash", tenant="acme")
+
+PROFILE = {"headline": "Engineer", "about": "", "experiences": [], "education": [], "skills": [], "projects": [], "certifications": []}
+
+def test_get_analysis_is_scoped_to_the_tenant(analysis_id):
+    assert asyncio.run(store.get_analysis(analysis_id, "acme"))["template_version"] == "v1"
+    assert asyncio.run(store.get_analysis(analysis_id, "beta")) is None
+    store._recent.clear()
+    assert asyncio.run(store.get_analysis(analysis_id, "beta")) is None
+    assert asyncio.run(store.get_analysis(analysis_id, "acme")) is not None
+
+def test_stored_analysis_endpoints_hide_other_tenants(analysis_id):
+    client = TestClient(main.app)
+    assert client.get(f"/analyses/{analysis_id}", headers={"X-API-Key": "key-b"}).status_code == 404
+    response = client.post("/analyze-incremental", headers={"X-API-Key": "key-b"},
+                           json={"previous_analysis_id": analysis_id, "profile": PROFILE})
+    assert response.status_code == 404
+
+def test_websocket_previous_analysis_is_scoped_to_the_tenant(analysis_id):
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/analyze?api_key=key-b") as ws:
+        assert ws.receive_json()["t"] == "hi"
+        ws.send_json({"t": "analyze", "j": 1, "profile": PROFILE, "previous_analysis_id": analysis_id})
+        assert ws.receive_json() == {"t": "go", "j": 1}
+        assert ws.receive_json() == {"t": "er", "m": "Previous analysis not found", "code": 404}
+        assert ws.receive_json() == {"t": "end", "j": 1}
+
+def test_key_less_callers_share_no_history(analysis_id):
+    record = {"personas": {}, "template_version": "v1"}
+    anonymous_id = store.save_analysis(record, {"results": {}}, profile_hash="hash")
+    first, second = TestClient(main.app), TestClient(main.app)
+    assert first.get("/analyses").status_code == 404
+    assert second.get("/analyses", params={"profile_hash": "hash"}).status_code == 404
+    # Only the holder of the random id can read a key-less analysis back
+    assert second.get(f"/analyses/{anonymous_id}").status_code == 200
+    assert second.get(f"/analyses/{analysis_id}").status_code == 404
+    assert [a["analysis_id"] for a in first.get("/analyses", headers={"X-API-Key": "key-a"}).json()["analyses"]] == [analysis_id]
+
+def test_persona_filter_uses_the_persona_index(analysis_id):
+    listed = asyncio.run(store.list_analyses("acme", persona="general"))
+    assert [entry["analysis_id"] for entry in listed] == [analysis_id]
+    assert asyncio.run(store.list_analyses("acme", persona="recruiter")) == []
+    with store.closing(store._connect()) as conn:
+        plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT analysis_id FROM analysis_personas WHERE persona = ?", ("general",)
+        ))
+    assert "idx_personas_persona" in plan
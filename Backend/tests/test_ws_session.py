@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+
+import main
+import ws_session
+
+PROFILE = {"headline": "Engineer", "about": "", "experiences": [], "education": [], "skills": [], "projects": [], "certifications": []}
+
+def test_binary_frame_is_answered_and_keeps_the_session():
+    with TestClient(main.app).websocket_connect("/ws/analyze") as ws:
+        assert ws.receive_json()["t"] == "hi"
+        ws.send_bytes(b"\x00\x01")
+        assert ws.receive_json() == {"t": "er", "m": "Binary frames are not supported, send JSON text"}
+        ws.send_json({"t": "zap"})
+        assert ws.receive_json() == {"t": "er", "m": "Unknown message type: zap"}
+
+def test_unexpected_job_failure_is_sent_to_the_client(monkeypatch):
+    async def broken(self, job):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(ws_session.Session, "_analyze", broken)
+    with TestClient(main.app).websocket_connect("/ws/analyze") as ws:
+        assert ws.receive_json()["t"] == "hi"
+        ws.send_json({"t": "analyze", "j": 7, "profile": PROFILE})
+        assert ws.receive_json() == {"t": "go", "j": 7}
+        assert ws.receive_json() == {"t": "er", "m": "Job failed: boom", "j": 7}
+        assert ws.receive_json() == {"t": "end", "j": 7}
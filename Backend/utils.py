@@ -3,6 +3,9 @@ This file contains utility and helper functions that can be used
 across the application, such as the stream merger.
 """
 import asyncio
+import hashlib
+import json
+import re
 
 async def merge_streams(*generators):
     """
@@ -40,3 +43,172 @@ async def merge_streams(*generators):
             except Exception as e:
                 # Re-raise the exception to be handled by the caller
                 raise Exception(f"Error in stream {idx}: {str(e)}")
+
+async def until_cancelled(generator, sections, cancelled: set):
+    """
+    Pass items through until every one of sections is in cancelled (which may grow
+    while streaming), then close the generator, ending its upstream call.
+    Nothing is requested from the generator if its sections are already cancelled.
+    """
+    try:
+        while not cancelled.issuperset(sections):
+            try:
+                item = await generator.__anext__()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await generator.aclose()
+
+
+
+# Delimiters of a multiplexed (fused) LLM response, one block per section
+SECTION_MARKER = re.compile(r"<<<(SECTION|END):([a-z_]+)>>>")
+MAX_MARKER_LENGTH = 40
+
+class DelimiterProtocolError(Exception):
+    """The model did not follow the section delimiter protocol of a fused call"""
+    def __init__(self, message: str, completed: list):
+        super().__init__(message)
+        self.completed = completed
+
+def section_start_marker(section: str) -> str:
+    return f"<<<SECTION:{section}>>>"
+
+def section_end_marker(section: str) -> str:
+    return f"<<<END:{section}>>>"
+
+async def demultiplex_sections(chunks, sections, max_stray_chars: int = 300):
+    """
+    Split one streamed response holding several delimited sections back into
+    per-section text as it arrives. A missing END before the next SECTION
+    marker, or after the last section, is tolerated.
+
+    Yields: (text, section_name) tuples
+    Raises: DelimiterProtocolError on unknown, repeated or mismatched markers, too much
+    text outside any section, or sections that never appeared. Its completed attribute
+    lists the sections that were fully received before the violation.
+    """
+    expected = set(sections)
+    completed = []
+    current = None
+    at_section_start = False
+    stray = 0
+    buffer = ""
+
+    def route(text):
+        nonlocal stray, at_section_start
+        if current is None:
+            stray += len(text.strip())
+            if stray > max_stray_chars:
+                raise DelimiterProtocolError("text outside the section delimiters", completed)
+            return None
+        if at_section_start:
+            text = text.lstrip()
+            at_section_start = not text
+        return text or None
+
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            while (match := SECTION_MARKER.search(buffer)) is not None:
+                text = route(buffer[:match.start()])
+                if text:
+                    yield (text, current)
+                buffer = buffer[match.end():]
+                kind, name = match.groups()
+                if kind == "SECTION":
+                    if name not in expected or name in completed or name == current:
+                        raise DelimiterProtocolError(f"unexpected section marker '{name}'", completed)
+                    if current is not None:
+                        completed.append(current)
+                    current, at_section_start = name, True
+                else:
+                    if name != current:
+                        raise DelimiterProtocolError(f"end marker '{name}' outside its section", completed)
+                    completed.append(current)
+                    current = None
+            
+            # Hold back a possible marker that is split across chunks
+            hold = buffer.find("<", max(0, len(buffer) - MAX_MARKER_LENGTH))
+            ready, buffer = (buffer, "") if hold == -1 else (buffer[:hold], buffer[hold:])
+            text = route(ready)
+            if text:
+                yield (text, current)
+        
+        text = route(buffer)
+        if text:
+            yield (text, current)
+        # A missing final END is fine, unless later sections are missing too (likely truncated)
+        if current is not None and len(completed) == len(sections) - 1:
+            completed.append(current)
+        missing = [section for section in sections if section not in completed]
+        if missing:
+            raise DelimiterProtocolError(f"missing section(s): {', '.join(missing)}", completed)
+    finally:
+        await chunks.aclose()
+
+
+def parse_partial_json(text: str):
+    """
+    Best-effort parse of a (possibly incomplete) JSON object streamed by an LLM.
+    Skips any preamble or markdown fence before the first '{', closes open
+    strings/brackets, and falls back to the last complete member if needed.
+
+    Returns: the parsed object, or None if nothing usable has arrived yet
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    text = text[start:]
+
+    closers = []
+    in_string = False
+    escape = False
+    cut_points = []
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch == '{':
+            closers.append('}')
+        elif ch == '[':
+            closers.append(']')
+        elif ch in '}]':
+            if closers:
+                closers.pop()
+            if not closers:
+                # The top-level object is complete; ignore any trailing text
+                try:
+                    return json.loads(text[:i + 1])
+                except json.JSONDecodeError:
+                    return None
+        elif ch == ',':
+            cut_points.append((i, ''.join(reversed(closers))))
+
+    # Incomplete object: close it as-is first, then retry at the last few commas
+    tail = text[:-1] if escape else text
+    candidates = [tail + ('"' if in_string else '') + ''.join(reversed(closers))]
+    candidates += [text[:i] + closing for i, closing in reversed(cut_points[-3:])]
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def hash_payload(value) -> str:
+    """Stable SHA-256 of any JSON-serializable value (dict key order does not matter)"""
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
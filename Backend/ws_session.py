@@ -0,0 +1,235 @@
+"""
+This file implements the optional WebSocket transport (/ws/analyze).
+One socket carries any number of consecutive analyses. The section streams
+of the analysis pipeline are multiplexed on it as numbered channels, using
+short-key JSON frames (compressed with permessage-deflate when the server
+supports it). The client can cancel or re-run single sections, pause the
+stream (the pipeline stops pulling from the providers until it resumes), and
+stop the running analysis.
+"""
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+import accounting
+import admission
+import analysis
+import config
+import store
+from models import LinkedInProfile
+
+# Channel id = index in this list; sent to the client in the first ("hi") frame
+CHANNELS = ['headline', 'about', 'experience', 'education', 'skills', 'projects', 'certifications', 'job_match', 'holistic']
+CHANNEL_IDS = {section: channel for channel, section in enumerate(CHANNELS)}
+
+# Short codes for the SSE event types and fields of the analysis pipeline
+EVENT_CODES = {
+    'pre_analysis': 'pa', 'status': 'st', 'persona_start': 'ps', 'section_start': 'ss', 'stream': 'd',
+    'partial': 'pt', 'section_result': 'sr', 'section_reset': 'rs', 'section_cancelled': 'sc',
+    'persona_complete': 'pc', 'complete': 'ok', 'rerun_complete': 'rr', 'error': 'er',
+}
+FIELD_CODES = {
+    'type': 't', 'section': 'c', 'chunk': 'd', 'data': 'v', 'message': 'm', 'persona': 'p', 'findings': 'f',
+    'results': 'r', 'analysis_id': 'a', 'usage': 'u', 'trace': 'tr', 'current': 'i', 'total': 'n',
+    'reused': 'ru', 'degraded': 'dg', 'trigger_fallback': 'fb',
+}
+
+stats = {"sessions": 0, "active": 0, "analyses": 0, "reruns": 0, "cancelled_sections": 0, "stopped": 0, "frames": 0}
+
+def encode_event(event: dict) -> str:
+    """Short-key frame for one pipeline event; sections become channel ids"""
+    frame = {}
+    for key, value in event.items():
+        if key == 'type':
+            value = EVENT_CODES.get(value, value)
+        elif key == 'section':
+            value = CHANNEL_IDS.get(value, value)
+        frame[FIELD_CODES.get(key, key)] = value
+    return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+def section_of(message: dict) -> Optional[str]:
+    """Section named in a client message, by channel id ("c") or name ("s")"""
+    channel = message.get("c")
+    if isinstance(channel, int) and 0 <= channel < len(CHANNELS):
+        return CHANNELS[channel]
+    name = message.get("s", channel)
+    return name if name in CHANNEL_IDS else None
+
+class Session:
+    """
+    One WebSocket connection. Client messages are handled as they arrive; "analyze"
+    and "rerun" jobs are queued and run one at a time in order.
+    """
+    def __init__(self, websocket: WebSocket, api_key: Optional[str]):
+        self.websocket = websocket
+        self.api_key = api_key
+        self.tenant = accounting.tenant_for(api_key)
+        self.jobs: asyncio.Queue = asyncio.Queue(maxsize=config.WEBSOCKET_MAX_QUEUED_JOBS)
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+        # Sections cancelled in the running job (a new set per job)
+        self.cancelled: set = set()
+        self.current: Optional[asyncio.Task] = None
+        # Profile and id of the last completed analysis, which re-runs apply to
+        self.last: Optional[tuple] = None
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, text: str):
+        async with self._send_lock:
+            await self.websocket.send_text(text)
+        stats["frames"] += 1
+
+    async def error(self, message: str, **fields):
+        await self.send(json.dumps({"t": "er", "m": message, **fields}, separators=(",", ":")))
+
+    async def run(self):
+        await self.websocket.accept()
+        stats["sessions"] += 1
+        stats["active"] += 1
+        worker = asyncio.create_task(self._worker())
+        try:
+            await self.send(json.dumps({"t": "hi", "ch": CHANNELS}, separators=(",", ":")))
+            while True:
+                try:
+                    message = json.loads(await self.websocket.receive_text())
+                except json.JSONDecodeError:
+                    await self.error("Invalid JSON message")
+                    continue
+                except KeyError:
+                    # Starlette's receive_text() has no "text" to return for a binary frame
+                    await self.error("Binary frames are not supported, send JSON text")
+                    continue
+                if not isinstance(message, dict):
+                    await self.error("Messages must be JSON objects")
+                    continue
+                await self.handle(message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            stats["active"] -= 1
+            worker.cancel()
+            if self.current is not None:
+                self.current.cancel()
+
+    # ==================== CLIENT MESSAGES ====================
+    async def handle(self, message: dict):
+        op = message.get("t")
+        if op == "analyze":
+            try:
+                profile = LinkedInProfile.model_validate(message.get("profile"))
+            except ValidationError as e:
+                await self.error("Invalid profile", j=message.get("j"), detail=json.loads(e.json(include_url=False)))
+                return
+            await self.enqueue({"op": "analyze", "j": message.get("j"), "profile": profile,
+                                "previous_analysis_id": message.get("previous_analysis_id")})
+        elif op == "rerun":
+            section = section_of(message)
+            if section is None:
+                await self.error("Unknown section", j=message.get("j"))
+                return
+            await self.enqueue({"op": "rerun", "j": message.get("j"), "section": section, "persona": message.get("p")})
+        elif op == "cancel":
+            section = section_of(message)
+            if section is None:
+                await self.error("Unknown section")
+            elif self.current is not None and section not in self.cancelled:
+                self.cancelled.add(section)
+                stats["cancelled_sections"] += 1
+        elif op == "pause":
+            self.resumed.clear()
+        elif op == "resume":
+            self.resumed.set()
+        elif op == "stop":
+            if self.current is not None:
+                self.current.cancel()
+        else:
+            await self.error(f"Unknown message type: {op}")
+
+    async def enqueue(self, job: dict):
+        try:
+            self.jobs.put_nowait(job)
+        except asyncio.QueueFull:
+            await self.error("Too many queued jobs on this connection", j=job["j"])
+
+    # ==================== JOBS ====================
+    async def _worker(self):
+        while True:
+            job = await self.jobs.get()
+            self.cancelled = set()
+            await self.send(json.dumps({"t": "go", "j": job["j"]}, separators=(",", ":")))
+            self.current = asyncio.create_task(self._run(job))
+            # wait() does not raise when the job is cancelled by a "stop" message
+            await asyncio.wait({self.current})
+            stopped = self.current.cancelled()
+            if not stopped and self.current.exception() is not None:
+                # Retrieve the failure so it is reported to the client instead of lost
+                e = self.current.exception()
+                print(f"⚠️ WebSocket job {job['op']} failed: {e!r}")
+                await self.error(f"Job failed: {e}", j=job["j"])
+            self.current = None
+            stats["stopped"] += int(stopped)
+            await self.send(json.dumps({"t": "end", "j": job["j"], **({"x": 1} if stopped else {})}, separators=(",", ":")))
+
+    async def _run(self, job: dict):
+        try:
+            if job["op"] == "analyze":
+                await self._analyze(job)
+            else:
+                await self._rerun(job)
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            await self.error(str(e.detail), code=e.status_code, **({"ra": int(retry_after)} if retry_after else {}))
+
+    async def _analyze(self, job: dict):
+        profile = job["profile"]
+        previous = None
+        if job["previous_analysis_id"]:
+            previous = await store.get_analysis(job["previous_analysis_id"], self.tenant)
+            if previous is None:
+                raise HTTPException(status_code=404, detail="Previous analysis not found")
+        accounting.check_quota(self.tenant)
+        ticket = await admission.admit(profile, self.api_key, tenant=self.tenant)
+        stats["analyses"] += 1
+        try:
+            frames = accounting.attributed_stream(
+                accounting.start_request(self.tenant),
+                analysis.stream_analysis_generator(profile, previous, ticket.degraded_sections, self.cancelled)
+            )
+            async for event in self._forward(frames):
+                if event['type'] == 'complete':
+                    self.last = (profile, event['analysis_id'])
+        finally:
+            admission.release(ticket)
+
+    async def _rerun(self, job: dict):
+        if self.last is None:
+            raise HTTPException(status_code=409, detail="No completed analysis on this connection to re-run")
+        profile, analysis_id = self.last
+        accounting.check_quota(self.tenant)
+        # Reserved like a full analysis: conservative, and released as soon as the section is done
+        ticket = await admission.admit(profile, self.api_key, tenant=self.tenant)
+        stats["reruns"] += 1
+        try:
+            frames = accounting.attributed_stream(
+                accounting.start_request(self.tenant),
+                analysis.rerun_section_generator(profile, analysis_id, job["section"], job["persona"], self.cancelled)
+            )
+            async for event in self._forward(frames):
+                if event['type'] == 'rerun_complete':
+                    self.last = (profile, event['analysis_id'])
+        finally:
+            admission.release(ticket)
+
+    async def _forward(self, frames):
+        """Send each SSE frame as a compact frame, yielding the decoded events. Pausing stops pulling from the pipeline."""
+        async for frame in frames:
+            await self.resumed.wait()
+            event = json.loads(frame[len("data: "):])
+            await self.send(encode_event(event))
+            yield event
+
+def metrics() -> dict:
+    return dict(stats)
@@ -256,6 +256,9 @@ const LinkedInProfileAnalyzer = () => {
             const sectionKey = `${data.section}_feedback`;
             currentPersonaData[sectionKey] = (currentPersonaData[sectionKey] || '') + data.chunk;
             setStreamingData(prev => ({ ...prev, [currentPersona]: { ...currentPersonaData } }));
+          } else if (data.type === 'section_reset') {
+            currentPersonaData[`${data.section}_feedback`] = '';
+            setStreamingData(prev => ({ ...prev, [currentPersona]: { ...currentPersonaData } }));
           } else if (data.type === 'section_complete') {
             setCompletedSections(prev => new Set([...prev, data.section]));
           } else if (data.type === 'persona_complete') {